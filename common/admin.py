@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from common import models 
+from common import balances, models, search
 
 
 class ClientPhoneNumberInline(admin.TabularInline):
@@ -14,6 +14,12 @@ class ClientAdmin(admin.ModelAdmin):
     inlines = [ClientPhoneNumberInline]
     search_fields = ['full_name', 'code_number']
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        search.refresh_documents([form.instance.id])
+        if not change:
+            balances.rebuild_balances([form.instance.id])
+
 @admin.register(models.Region)
 class RegionAdmin(admin.ModelAdmin):
     list_display = ['id', 'name']
@@ -24,6 +30,13 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'price', 'count', 'client']
     autocomplete_fields = ['client']
 
+    def save_model(self, request, obj, form, change):
+        client_ids = {obj.client_id}
+        if change:
+            client_ids.update(models.Order.objects.filter(pk=obj.pk).values_list('client_id', flat=True))
+        super().save_model(request, obj, form, change)
+        balances.rebuild_balances(client_ids)
+
 
 @admin.register(models.NumberOfTrips)
 class NumberOfTripsAdmin(admin.ModelAdmin):
@@ -6,4 +6,7 @@ class CommonConfig(AppConfig):
     name = 'common'
 
     def ready(self):
-        import common.signals
\ No newline at end of file
+        import common.signals
+        from common.middleware import install_serializer_timer
+
+        install_serializer_timer()
\ No newline at end of file
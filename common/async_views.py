@@ -0,0 +1,91 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from django.http import JsonResponse
+from django.views import View
+
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from common import filters, models, serializers, views
+
+
+# Async variants of the read endpoints for ASGI deployments. They share the
+# querysets and serializers of the DRF views; serializers only touch rows
+# that were fully loaded (select_related/prefetch_related) beforehand.
+
+
+async def paginate(request, queryset):
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        return None
+
+    offset = (page - 1) * page_size
+    count, rows = await asyncio.gather(
+        queryset.acount(),
+        fetch(queryset[offset:offset + page_size]),
+    )
+    if page > 1 and not rows:
+        return None
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if offset + page_size < count else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return {'count': count, 'next': next_url, 'previous': previous_url, 'results': rows}
+
+
+async def fetch(queryset):
+    return [row async for row in queryset.aiterator(chunk_size=api_settings.PAGE_SIZE)]
+
+
+def paginated_response(page, serializer):
+    if page is None:
+        return JsonResponse({'detail': 'Invalid page.'}, status=404)
+    if isinstance(serializer, serializers.ValuesSerializer):
+        page['results'] = serializer.many(page['results'])
+    else:
+        page['results'] = serializer(page['results'], many=True).data
+    return JsonResponse(page)
+
+
+class AsyncRegionListView(View):
+    async def get(self, request):
+        page = await paginate(request, serializers.region_values.rows(views.RegionListApiView.queryset))
+        return paginated_response(page, serializers.region_values)
+
+
+class AsyncClientListView(View):
+    async def get(self, request):
+        filterset = filters.ClientFilter(request.GET, queryset=views.ClientListApiView.queryset)
+        if not filterset.is_valid():
+            return JsonResponse(filterset.errors, status=400)
+        # the number filter runs its selection query while building qs
+        queryset = await sync_to_async(lambda: filterset.qs)()
+        page = await paginate(request, queryset)
+        return paginated_response(page, serializers.ClientListSerializer)
+
+
+class AsyncClientDetailView(View):
+    async def get(self, request, client_id):
+        try:
+            client = await views.ClientDetailApiView.queryset.aget(id=client_id)
+        except models.Client.DoesNotExist:
+            return JsonResponse({'error': 'Client not found'}, status=404)
+        return JsonResponse(serializers.ClientDetailSerializer(client).data)
+
+
+class AsyncClientOrderListView(View):
+    async def get(self, request, client_id):
+        orders = models.Order.objects.filter(client=client_id).order_by('-created_at', '-id')
+        page = await paginate(request, serializers.client_order_values.rows(orders))
+        return paginated_response(page, serializers.client_order_values)
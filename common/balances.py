@@ -0,0 +1,116 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Sum, Value, When
+from django.utils import timezone
+
+from common import models
+
+
+def build_balance(client, order):
+    return models.ClientBalance(
+        client=client,
+        total_debt=order.indebtedness or 0,
+        empty_bottles=order.the_rest or 0,
+        orders_count=1,
+        last_order=order,
+        last_order_status=order.status,
+    )
+
+
+def record_order_created(order):
+    updated = models.ClientBalance.objects.filter(client_id=order.client_id).update(
+        total_debt=F('total_debt') + (order.indebtedness or 0),
+        empty_bottles=F('empty_bottles') + (order.the_rest or 0),
+        orders_count=F('orders_count') + 1,
+        last_order=order,
+        last_order_status=order.status,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        rebuild_balances([order.client_id])
+
+
+def record_order_updated(order, previous):
+    # previous holds the indebtedness, the_rest and status the order had before the update
+    updated = models.ClientBalance.objects.filter(client_id=order.client_id).update(
+        total_debt=F('total_debt') + ((order.indebtedness or 0) - (previous['indebtedness'] or 0)),
+        empty_bottles=F('empty_bottles') + ((order.the_rest or 0) - (previous['the_rest'] or 0)),
+        last_order_status=Case(
+            When(last_order=order.pk, then=Value(order.status)),
+            default=F('last_order_status'),
+        ),
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        rebuild_balances([order.client_id])
+
+
+def record_order_deleted(order):
+    # when the client itself is being deleted its balance is already gone
+    if models.ClientBalance.objects.filter(client_id=order.client_id).exists():
+        rebuild_balances([order.client_id])
+
+
+def record_orders_status(order_ids, status):
+    models.ClientBalance.objects.filter(last_order__in=order_ids).update(
+        last_order_status=status, updated_at=timezone.now()
+    )
+
+
+def order_snapshot(order):
+    return {'indebtedness': order.indebtedness, 'the_rest': order.the_rest, 'status': order.status}
+
+
+def _client_id_batches(client_ids, batch_size):
+    if client_ids is None:
+        last_id = 0
+        while True:
+            batch = list(
+                models.Client.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
+    else:
+        client_ids = iter(client_ids)
+        while batch := list(islice(client_ids, batch_size)):
+            yield batch
+
+
+def rebuild_balances(client_ids=None, batch_size=1000):
+    rebuilt = 0
+    for batch in _client_id_batches(client_ids, batch_size):
+        totals = {
+            row['client']: row
+            for row in models.Order.objects.filter(client__in=batch).values('client').annotate(
+                total_debt=Sum('indebtedness'),
+                empty_bottles=Sum('the_rest'),
+                orders_count=Count('id'),
+                last_order=Max('id'),
+            ).order_by()
+        }
+        statuses = dict(
+            models.Order.objects.filter(id__in=[row['last_order'] for row in totals.values()]).values_list('id', 'status')
+        )
+        balances = []
+        for client_id in batch:
+            row = totals.get(client_id, {})
+            balances.append(models.ClientBalance(
+                client_id=client_id,
+                total_debt=row.get('total_debt') or 0,
+                empty_bottles=row.get('empty_bottles') or 0,
+                orders_count=row.get('orders_count', 0),
+                last_order_id=row.get('last_order'),
+                last_order_status=statuses.get(row.get('last_order'), ''),
+            ))
+        with transaction.atomic():
+            models.ClientBalance.objects.bulk_create(
+                balances,
+                update_conflicts=True,
+                unique_fields=['client'],
+                update_fields=['total_debt', 'empty_bottles', 'orders_count', 'last_order', 'last_order_status', 'updated_at'],
+            )
+        rebuilt += len(balances)
+    return rebuilt
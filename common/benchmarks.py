@@ -0,0 +1,192 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from common import caching, jobs, models, sync
+
+
+# Query-count and latency budgets for every endpoint in common/urls.py. Query
+# counts must not depend on the amount of data, so they are exact: a change
+# means an N+1 or a removed query and the budget is updated on purpose. The
+# latency budgets are for a database filled by `manage.py seed_perf_data`.
+BUDGETS = {
+    'client create api': {'queries': 9, 'ms': 300},
+    'client import api': {'queries': 8, 'ms': 500},
+    'client order create api': {'queries': 5, 'ms': 300},
+    'client orders list api': {'queries': 3, 'ms': 200},
+    'client detail api': {'queries': 3, 'ms': 200},
+    'client list api': {'queries': 4, 'ms': 300},
+    'client update api': {'queries': 9, 'ms': 300},
+    'client bulk update api': {'queries': 9, 'ms': 300},
+    'client order update api': {'queries': 6, 'ms': 300},
+    'order status update api': {'queries': 5, 'ms': 300},
+    'order status change api': {'queries': 5, 'ms': 300},
+    'order received update api': {'queries': 6, 'ms': 300},
+    'order operations api': {'queries': 11, 'ms': 300},
+    'number of trips create api': {'queries': 4, 'ms': 300},
+    'number of trips delete api': {'queries': 3, 'ms': 300},
+    'truck load api': {'queries': 1, 'ms': 1000},
+    'region list api': {'queries': 2, 'ms': 100},
+    'sync api': {'queries': 5, 'ms': 500},
+    'client export api': {'queries': 2, 'ms': 300},
+    'order export api': {'queries': 1, 'ms': 2000},
+    'reports api': {'queries': 1, 'ms': 300},
+    'balance rebuild api': {'queries': 1, 'ms': 100},
+    'job list api': {'queries': 2, 'ms': 100},
+    'job detail api': {'queries': 1, 'ms': 100},
+    'async client list api': {'queries': 4, 'ms': 300},
+    'async client detail api': {'queries': 2, 'ms': 200},
+    'async client orders list api': {'queries': 2, 'ms': 200},
+    'async region list api': {'queries': 2, 'ms': 100},
+}
+
+
+def url(name, **params):
+    return reverse(name) + '?' + urlencode(params, doseq=True)
+
+
+def with_job(name, detail=False):
+    # the job is created inside the rolled back transaction, see measure()
+    def path():
+        job = jobs.enqueue('rollup_orders')
+        return reverse(name, args=[job.id]) if detail else reverse(name)
+    return path
+
+
+def endpoint_requests():
+    """
+    Return {url name: (method, path, data)} for every budgeted endpoint, built
+    from rows already in the database. Raises ValueError when it is empty. A
+    callable path is resolved by prepare() inside the measured transaction.
+    """
+    # a client with a single phone number keeps the client update count fixed
+    order = models.Order.objects.filter(status='new').annotate(numbers_count=Count('client__numbers')).filter(
+        numbers_count=1
+    ).select_related('client').order_by('-id').first()
+    trip = models.NumberOfTrips.objects.order_by('-id').first()
+    if order is None or trip is None:
+        raise ValueError('no pending order or trip found, run seed_perf_data first')
+    client = order.client
+    other = models.Client.objects.exclude(id=client.id).order_by('id').first()
+    region = client.region_id
+    code_number = (models.Client.objects.aggregate(last=Max('code_number'))['last'] or 0) + 1
+    yesterday = timezone.now().date() - timedelta(days=1)
+
+    def new_client(code_number):
+        return {
+            'code_number': code_number, 'full_name': f'benchmark {code_number}', 'region': region,
+            'location_text': 'location', 'cooler': 'cooler', 'phone_numbers': ['+998901112233'],
+            'capsule_price': 10000, 'client_type': 'physical_person', 'order_count': 2, 'paid': 20000,
+            'payment_type': 'cash',
+        }
+
+    return {
+        'client create api': ('post', reverse('client create api'), new_client(code_number)),
+        'client import api': (
+            'post', reverse('client import api'), [new_client(code_number + i) for i in range(1, 51)]
+        ),
+        'client order create api': (
+            'post', reverse('client order create api'),
+            {'client_id': client.id, 'count': 2, 'paid': 20000, 'indebtedness': 0, 'payment_type': 'cash'},
+        ),
+        'client orders list api': ('get', reverse('client orders list api', args=[client.id]), None),
+        'client detail api': ('get', reverse('client detail api', args=[client.id]), None),
+        'client list api': ('get', reverse('client list api'), None),
+        'client update api': (
+            'patch', reverse('client update api', args=[client.id]),
+            {'full_name': 'benchmark client', 'numbers': [{'number': '+998901112233'}]},
+        ),
+        'client bulk update api': (
+            'patch', reverse('client bulk update api'),
+            [
+                {'id': client.id, 'full_name': 'benchmark client', 'numbers': [{'number': '+998901112233'}]},
+                {'id': other.id, 'price': other.price + 1000},
+            ],
+        ),
+        'client order update api': ('patch', reverse('client order update api', args=[order.id]), {'paid': 1000}),
+        'order status update api': ('post', reverse('order status update api'), {'ids': [order.id]}),
+        'order status change api': ('get', reverse('order status change api', args=[order.id]), None),
+        'order received update api': ('patch', reverse('order received update api', args=[order.id]), {'received': 1}),
+        'order operations api': (
+            'post', reverse('order operations api'),
+            {'operations': [
+                {'key': str(uuid.uuid4()), 'type': 'payment', 'order_id': order.id, 'amount': 1000},
+                {'key': str(uuid.uuid4()), 'type': 'delivery', 'order_id': order.id, 'received': 1},
+            ]},
+        ),
+        'number of trips create api': (
+            'post', reverse('number of trips create api'), {'client_ids': [client.id], 'number': '1'}
+        ),
+        'number of trips delete api': ('delete', reverse('number of trips delete api', args=[trip.id]), None),
+        'truck load api': ('post', reverse('truck load api'), {'capacity': 300, 'regions': [region]}),
+        'region list api': ('get', reverse('region list api'), None),
+        'sync api': ('get', url('sync api', token=sync.next_token()), None),
+        'client export api': ('get', url('client export api', search=client.code_number), None),
+        'order export api': ('get', url('order export api', date_from=yesterday, date_to=yesterday), None),
+        'reports api': (
+            'get', url('reports api', date_from=yesterday - timedelta(days=30), date_to=yesterday,
+                       group_by=['region', 'payment_type']), None,
+        ),
+        'balance rebuild api': ('post', reverse('balance rebuild api'), {'client_ids': [client.id]}),
+        'job list api': ('get', with_job('job list api'), None),
+        'job detail api': ('get', with_job('job detail api', detail=True), None),
+        'async client list api': ('get', reverse('async client list api'), None),
+        'async client detail api': ('get', reverse('async client detail api', args=[client.id]), None),
+        'async client orders list api': ('get', reverse('async client orders list api', args=[client.id]), None),
+        'async region list api': ('get', reverse('async region list api'), None),
+    }
+
+
+def prepare(path):
+    return path() if callable(path) else path
+
+
+def send(api, method, path, data):
+    started = time.perf_counter()
+    response = getattr(api, method)(path, data, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response, (time.perf_counter() - started) * 1000
+
+
+def measure(api, method, path, data):
+    # writes are rolled back so that every run sees the same rows
+    caching.invalidate('regions')
+    with transaction.atomic():
+        path = prepare(path)
+        with CaptureQueriesContext(connection) as queries:
+            response, elapsed = send(api, method, path, data)
+        transaction.set_rollback(True)
+    return {'status': response.status_code, 'queries': len(queries), 'ms': elapsed}
+
+
+def run(names=None, repeat=5):
+    api = APIClient()
+    results = []
+    for name, (method, path, data) in endpoint_requests().items():
+        if names and name not in names:
+            continue
+        runs = [measure(api, method, path, data) for _ in range(repeat)]
+        budget = BUDGETS[name]
+        result = {
+            'name': name,
+            'method': method.upper(),
+            'status': runs[0]['status'],
+            'queries': runs[0]['queries'],
+            'budget_queries': budget['queries'],
+            'ms': round(statistics.median(run['ms'] for run in runs), 2),
+            'budget_ms': budget['ms'],
+        }
+        result['ok'] = result['status'] < 400 and result['queries'] == budget['queries'] and result['ms'] <= budget['ms']
+        results.append(result)
+    return results
@@ -0,0 +1,84 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from rest_framework.response import Response
+
+from common import models
+
+
+# Version stamps expire like the data they guard: with a per-process cache
+# a worker that did not see the write starts a new version after at most
+# VERSION_TIMEOUT instead of serving the old ETag forever.
+VERSION_TIMEOUT = 60 * 5
+
+
+def get_version(name):
+    version = cache.get(f'{name}:version')
+    if version is None:
+        cache.add(f'{name}:version', time.time(), VERSION_TIMEOUT)
+        version = cache.get(f'{name}:version')
+    return version
+
+
+def invalidate(name):
+    cache.set(f'{name}:version', time.time(), VERSION_TIMEOUT)
+
+
+class CachedListMixin:
+    # Serves a list view from the cache and answers conditional GETs with 304.
+    # Entries are keyed by a version stamp that invalidate(cache_name) bumps,
+    # see common/signals.py. The version also gives ETag and Last-Modified.
+    cache_name = None
+    cache_timeout = VERSION_TIMEOUT
+
+    def get_etag(self, request, *args, **kwargs):
+        return f'{self.cache_name}-{get_version(self.cache_name)}'
+
+    def get_last_modified(self, request, *args, **kwargs):
+        # aware, because condition() reads naive datetimes as UTC
+        return datetime.fromtimestamp(int(get_version(self.cache_name)), tz=timezone.utc)
+
+    def get(self, request, *args, **kwargs):
+        return condition(etag_func=self.get_etag, last_modified_func=self.get_last_modified)(
+            super().get
+        )(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # hashed so that long query strings cannot make long cache keys
+        key = f'{self.cache_name}:{get_version(self.cache_name)}:{make_etag(request.get_full_path())}'
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, self.cache_timeout)
+        return Response(data)
+
+
+def make_etag(*values):
+    return hashlib.md5(repr(values).encode()).hexdigest()
+
+
+def client_detail_etag(request, client_id):
+    # everything ClientDetailSerializer reads: the client, its region,
+    # balance and phone numbers
+    numbers = models.ClientPhoneNumber.objects.filter(client=OuterRef('pk')).values('client')
+    client = models.Client.objects.filter(id=client_id).values(
+        'updated_at', 'region__updated_at', 'balance__updated_at'
+    ).annotate(
+        numbers_updated_at=Subquery(numbers.annotate(value=Max('updated_at')).values('value')),
+        numbers_count=Subquery(numbers.annotate(value=Count('id')).values('value')),
+    ).first()
+    if client is None:
+        return None
+    return make_etag(client)
+
+
+def client_orders_etag(request, client_id):
+    orders = models.Order.objects.filter(client=client_id).aggregate(
+        updated_at=Max('updated_at'), count=Count('id')
+    )
+    return make_etag(orders)
@@ -0,0 +1,57 @@
+import csv
+
+from common import models
+
+
+CLIENT_HEADER = [
+    'id', 'code_number', 'full_name', 'region', 'client_type', 'location_text', 'phone_numbers',
+    'last_order_id', 'last_order_date', 'last_order_count', 'last_order_price', 'last_order_status', 'all_debt',
+    'empty_dish',
+]
+ORDER_HEADER = [
+    'id', 'created_at', 'client_code_number', 'client_full_name', 'region', 'count', 'price', 'received', 'the_rest',
+    'paid', 'indebtedness', 'status', 'payment_type',
+]
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def client_queryset():
+    return models.Client.objects.select_related('region', 'balance__last_order').prefetch_related('numbers').distinct()
+
+
+def order_queryset():
+    return models.Order.objects.select_related('client__region').order_by('created_at', 'id')
+
+
+def client_rows(queryset, chunk_size=2000):
+    for client in queryset.iterator(chunk_size=chunk_size):
+        balance = getattr(client, 'balance', None)
+        order = balance.last_order if balance else None
+        yield [
+            client.id, client.code_number, client.full_name, client.region.name, client.client_type,
+            client.location_text, ', '.join(number.number for number in client.numbers.all()),
+            order.id if order else '', order.created_at.strftime('%Y-%m-%d %H:%M') if order else '',
+            order.count if order else '', order.price if order else '', order.status if order else '',
+            balance.total_debt if balance else '', balance.empty_bottles if balance else '',
+        ]
+
+
+def order_rows(queryset, chunk_size=2000):
+    for order in queryset.iterator(chunk_size=chunk_size):
+        yield [
+            order.id, order.created_at.strftime('%Y-%m-%d %H:%M'), order.client.code_number, order.client.full_name,
+            order.client.region.name, order.count, order.price, order.received, order.the_rest, order.paid,
+            order.indebtedness, order.status, order.payment_type,
+        ]
+
+
+def iter_csv(header, rows):
+    # the BOM makes Excel read the file as UTF-8 (names are Cyrillic/Uzbek)
+    writer = csv.writer(Echo())
+    yield '﻿' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
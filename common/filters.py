@@ -1,7 +1,7 @@
 import django_filters 
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 
-from common import models, serializers
+from common import models, search, serializers
 
 
 class ClientFilter(django_filters.FilterSet):
@@ -17,11 +17,7 @@ class ClientFilter(django_filters.FilterSet):
         fields = ['region', 'is_new', 'search', 'client_type', 'number_of_trips', 'is_delivered', 'number', ]
 
     def filter_by_all(self, queryset, name, value):
-        return queryset.filter(
-            Q(full_name__icontains=value) |
-            Q(code_number__icontains=value) |
-            Q(numbers__number__icontains=value)
-        ).distinct()
+        return search.search(queryset, value)
     
     def filter_by_new(self, queryset, name, value):
         if value == True:
@@ -56,20 +52,36 @@ class ClientFilter(django_filters.FilterSet):
             return queryset
         
     def filter_by_number(self, queryset, name, value):
-        clients = queryset.distinct()
+        latest_order_count = models.Order.objects.filter(
+            client=OuterRef('pk'), count__lte=value
+        ).order_by('-created_at').values('count')[:1]
+        clients = queryset.prefetch_related(None).distinct().annotate(
+            latest_order_count=Subquery(latest_order_count)
+        ).values_list('pk', 'latest_order_count')
+
         count = 0
         result = []
-        for client in clients:
-            order = client.orders.filter(count__lte=value).order_by('-created_at').first()
-            if not order:
+        for client_id, order_count in clients.iterator(chunk_size=2000):
+            if order_count is None:
                 continue
-            if order.count == value:
-                count += order.count
-                result.append(client.pk)
-            elif  count + order.count <= value:
-                count += order.count
-                result.append(client.pk)
-                        
+            if order_count == value:
+                count += order_count
+                result.append(client_id)
+            elif count + order_count <= value:
+                count += order_count
+                result.append(client_id)
+
             if count == value:
                 break
-        return queryset.filter(pk__in=result)
\ No newline at end of file
+        return queryset.filter(pk__in=result)
+
+
+class OrderFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(field_name='created_at', lookup_expr='date__gte')
+    date_to = django_filters.DateFilter(field_name='created_at', lookup_expr='date__lte')
+    region = django_filters.NumberFilter(field_name='client__region')
+
+    class Meta:
+        model = models.Order
+        fields = ['date_from', 'date_to', 'region', 'status', 'payment_type']
+
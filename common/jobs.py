@@ -0,0 +1,200 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from common import exports, filters, models, reports
+from common.balances import rebuild_balances
+
+
+logger = logging.getLogger('common.jobs')
+
+BACKOFF = timedelta(seconds=10)  # doubled after every failed attempt
+STALE_AFTER = timedelta(minutes=5)  # running jobs whose heartbeat stopped are retried after this
+HEARTBEAT_INTERVAL = 60  # seconds between locked_at refreshes of a running job
+PROGRESS_INTERVAL = 1  # seconds between progress writes
+
+TASKS = {}
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, max_attempts=3, run_at=None):
+    if name not in TASKS:
+        raise ValueError(f'unknown job {name}')
+    return models.Job.objects.create(
+        name=name, payload=payload or {}, max_attempts=max_attempts, run_at=run_at or timezone.now()
+    )
+
+
+class Progress:
+    def __init__(self, job):
+        self.job = job
+        self.written = 0
+
+    def __call__(self, done, total=None, force=False):
+        # throttled so that tight loops do not turn into one UPDATE per row
+        if not force and time.monotonic() - self.written < PROGRESS_INTERVAL and done != total:
+            return
+        self.written = time.monotonic()
+        # doubles as a heartbeat, see heartbeat()
+        now = timezone.now()
+        fields = {'progress': done, 'locked_at': now, 'updated_at': now}
+        if total is not None:
+            fields['total'] = total
+        models.Job.objects.filter(id=self.job.id).update(**fields)
+
+
+def claim(worker):
+    # a conditional UPDATE hands each job to exactly one worker without
+    # needing SELECT ... FOR UPDATE SKIP LOCKED
+    now = timezone.now()
+    candidates = models.Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+    for job_id in candidates.values_list('id', flat=True)[:10]:
+        claimed = models.Job.objects.filter(id=job_id, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, updated_at=now
+        )
+        if claimed:
+            return models.Job.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale():
+    now = timezone.now()
+    return models.Job.objects.filter(status='running', locked_at__lt=now - STALE_AFTER).update(
+        status='queued', locked_by='', locked_at=None, run_at=now, updated_at=now
+    )
+
+
+def heartbeat(job, stop):
+    # keeps locked_at fresh so that requeue_stale only picks up jobs whose
+    # worker died, however long the task runs
+    try:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            models.Job.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+                locked_at=timezone.now()
+            )
+    finally:
+        connections.close_all()
+
+
+def run(job):
+    job.attempts += 1
+    stop = threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(job, stop), daemon=True)
+    beat.start()
+    try:
+        result = TASKS[job.name](Progress(job), **job.payload)
+    except Exception:
+        logger.exception('job %s #%s failed', job.name, job.id)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_at = timezone.now() + BACKOFF * 2 ** (job.attempts - 1)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+    else:
+        job.refresh_from_db(fields=['total'])
+        job.status = 'succeeded'
+        job.result = result
+        job.error = ''
+        job.finished_at = timezone.now()
+        if job.total is not None:
+            job.progress = job.total
+    finally:
+        stop.set()
+        beat.join()
+    job.locked_by = ''
+    job.locked_at = None
+    fields = ['attempts', 'status', 'run_at', 'result', 'error', 'finished_at', 'locked_by', 'locked_at', 'updated_at']
+    if job.status == 'succeeded':
+        fields += ['progress', 'total']
+    # otherwise keep the progress the task wrote before failing
+    job.save(update_fields=fields)
+    return job
+
+
+def work(worker=None, once=False, poll=1.0, stop=None):
+    """
+    Run queued jobs until `stop` is set. With once=True return as soon as
+    there is nothing left to run, which is how tests and cron use it.
+    """
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    stop = stop or threading.Event()
+    processed = 0
+    while not stop.is_set():
+        close_old_connections()
+        requeue_stale()
+        job = claim(worker)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll)
+            continue
+        run(job)
+        processed += 1
+    close_old_connections()
+    return processed
+
+
+@task('rebuild_balances')
+def rebuild_balances_task(progress, client_ids=None):
+    return {'rebuilt': rebuild_balances(client_ids)}
+
+
+@task('rollup_orders')
+def rollup_orders_task(progress, full=False):
+    return {'dates': reports.rollup_orders(full=full)}
+
+
+@task('assign_trips')
+def assign_trips_task(progress, client_ids, number, batch_size=1000):
+    # each batch commits together with its progress: the job shows progress
+    # while it runs, holds no lock on its row for longer than one batch, and
+    # a retry resumes after the last committed batch instead of duplicating it
+    for start in range(progress.job.progress, len(client_ids), batch_size):
+        with transaction.atomic():
+            models.NumberOfTrips.objects.bulk_create([
+                models.NumberOfTrips(client_id=client_id, number=number)
+                for client_id in client_ids[start:start + batch_size]
+            ])
+            progress(min(start + batch_size, len(client_ids)), len(client_ids), force=True)
+    return {'created': len(client_ids)}
+
+
+@task('export')
+def export_task(progress, kind, params=None):
+    if kind == 'clients':
+        filterset = filters.ClientFilter(params or {}, queryset=exports.client_queryset().order_by('id'))
+        header, rows = exports.CLIENT_HEADER, exports.client_rows
+    else:
+        filterset = filters.OrderFilter(params or {}, queryset=exports.order_queryset())
+        header, rows = exports.ORDER_HEADER, exports.order_rows
+    if not filterset.is_valid():
+        raise ValueError(filterset.errors.as_json())
+
+    total = filterset.qs.count()
+    name = os.path.join('exports', f'{kind}-{progress.job.id}.csv')
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        # the first chunk is the header
+        for written, chunk in enumerate(exports.iter_csv(header, rows(filterset.qs))):
+            f.write(chunk)
+            if written:
+                progress(written, total)
+    progress(total, total)
+    return {'file': settings.MEDIA_URL + name.replace(os.sep, '/'), 'rows': total}
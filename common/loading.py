@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from common import models
+
+
+def best_fill(counts, capacity):
+    # Bounded subset sum over bottle counts: counts maps a bottle count to how
+    # many pending orders have it. Returns {count: orders to take} for the
+    # largest total that fits. O(capacity * distinct counts).
+    reachable = [False] * (capacity + 1)
+    reachable[0] = True
+    via = [0] * (capacity + 1)
+    for count, available in sorted(counts.items()):
+        if count <= 0 or count > capacity:
+            continue
+        used = [0] * (capacity + 1)
+        for total in range(count, capacity + 1):
+            if not reachable[total] and reachable[total - count] and used[total - count] < available:
+                reachable[total] = True
+                used[total] = used[total - count] + 1
+                via[total] = count
+
+    total = max(total for total in range(capacity + 1) if reachable[total])
+    taken = defaultdict(int)
+    while total:
+        taken[via[total]] += 1
+        total -= via[total]
+    return dict(taken)
+
+
+def count_orders(orders):
+    counts = defaultdict(int)
+    for order_id, count, region_id in orders:
+        counts[count] += 1
+    return counts
+
+
+def bottles(taken):
+    return sum(count * number for count, number in taken.items())
+
+
+def plan_load(orders, capacity):
+    # orders are (order_id, count, region_id) tuples, oldest first; among orders
+    # of the same count the oldest are taken. A single region reaching the best
+    # fill on its own is preferred so the truck stays in one area.
+    by_region = defaultdict(list)
+    for order in orders:
+        by_region[order[2]].append(order)
+
+    taken = best_fill(count_orders(orders), capacity)
+    best = bottles(taken)
+    candidates = orders
+    for region_orders in sorted(by_region.values(), key=len, reverse=True):
+        region_taken = best_fill(count_orders(region_orders), capacity)
+        if bottles(region_taken) == best:
+            taken, candidates = region_taken, region_orders
+            break
+
+    selected = []
+    for order in candidates:
+        if taken.get(order[1]):
+            taken[order[1]] -= 1
+            selected.append(order)
+    return selected
+
+
+def load_truck(capacity, regions=None, number=None):
+    orders = models.Order.objects.filter(status='new', count__gt=0, count__lte=capacity)
+    if regions:
+        orders = orders.filter(client__region__in=regions)
+    orders = list(orders.order_by('created_at', 'id').values_list('id', 'count', 'client__region', 'client'))
+
+    clients = {order[0]: order[3] for order in orders}
+    selected = plan_load([order[:3] for order in orders], capacity)
+
+    if number is not None:
+        client_ids = list(dict.fromkeys(clients[order_id] for order_id, count, region_id in selected))
+        with transaction.atomic():
+            models.NumberOfTrips.objects.bulk_create(
+                [models.NumberOfTrips(client_id=client_id, number=number) for client_id in client_ids],
+                batch_size=1000,
+            )
+
+    regions = defaultdict(lambda: {'order_ids': [], 'bottles': 0})
+    for order_id, count, region_id in selected:
+        regions[region_id]['order_ids'].append(order_id)
+        regions[region_id]['bottles'] += count
+    return {
+        'capacity': capacity,
+        'bottles': sum(count for order_id, count, region_id in selected),
+        'order_ids': [order_id for order_id, count, region_id in selected],
+        'regions': [{'region': region_id, **region} for region_id, region in regions.items()],
+    }
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from common import models
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/sec of the sync read endpoints with their async variants on the current database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        client = models.Client.objects.filter(orders__isnull=False).first()
+        if client is None:
+            raise CommandError('no client with orders, seed the database first')
+
+        endpoints = [
+            ('client list api', {}),
+            ('client detail api', {'client_id': client.id}),
+            ('client orders list api', {'client_id': client.id}),
+            ('region list api', {}),
+        ]
+        for name, kwargs in endpoints:
+            sync_url = reverse(name, kwargs=kwargs)
+            async_url = reverse(f'async {name}', kwargs=kwargs)
+            for concurrency in options['concurrency']:
+                sync_rps = self.measure_sync(sync_url, options['requests'], concurrency)
+                async_rps = asyncio.run(self.measure_async(async_url, options['requests'], concurrency))
+                self.stdout.write(
+                    f'{name:<24} concurrency={concurrency:<4} sync={sync_rps:8.1f} req/s  async={async_rps:8.1f} req/s'
+                )
+
+    def measure_sync(self, url, requests, concurrency):
+        def get(_):
+            response = Client().get(url)
+            connections.close_all()
+            return response.status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            list(executor.map(get, range(requests)))
+            return requests / (time.perf_counter() - started)
+
+    async def measure_async(self, url, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with semaphore:
+                return (await client.get(url)).status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(get() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
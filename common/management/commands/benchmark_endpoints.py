@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from common import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time every API endpoint against its query and latency budget and save the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='url names to run, all by default')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='defaults to benchmarks/endpoints-<timestamp>.json')
+        parser.add_argument('--compare', help='a previous results file to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmarks.run(options['names'], repeat=options['repeat'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = {result['name']: result for result in json.load(f)['results']}
+
+        for result in results:
+            line = (
+                f"{result['name']:<30} {result['status']}  queries {result['queries']:>3}/{result['budget_queries']:<3}"
+                f"  {result['ms']:>9.2f}/{result['budget_ms']} ms"
+            )
+            if result['name'] in previous:
+                before = previous[result['name']]
+                line += f"  ({result['queries'] - before['queries']:+d} queries, {result['ms'] - before['ms']:+.2f} ms)"
+            self.stdout.write(line if result['ok'] else self.style.ERROR(line))
+
+        started = timezone.now()
+        output = options['output'] or os.path.join('benchmarks', f'endpoints-{started:%Y%m%d-%H%M%S}.json')
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': started.isoformat(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+                'results': results,
+            }, f, indent=2)
+        self.stdout.write(f'results saved to {output}')
+
+        failed = [result['name'] for result in results if not result['ok']]
+        if failed:
+            raise CommandError(f'over budget: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('all endpoints within budget'))
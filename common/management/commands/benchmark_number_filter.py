@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from common import models
+from common.filters import ClientFilter
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time the "number" client filter over synthetic clients, rolling the data back afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--number', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        for size in options['clients']:
+            try:
+                with transaction.atomic():
+                    self.seed(size)
+                    self.measure(size, options['number'], options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, size):
+        rng = random.Random(size)
+        region = models.Region.objects.create(name='benchmark')
+        start = (models.Client.objects.order_by('-code_number').values_list('code_number', flat=True).first() or 0) + 1
+        clients = models.Client.objects.bulk_create([
+            models.Client(
+                code_number=start + i, full_name=f'benchmark {i}', region=region, location_text='-',
+                cooler='-', price=10000, client_type='physical_person',
+            )
+            for i in range(size)
+        ], batch_size=2000)
+        models.Order.objects.bulk_create([
+            models.Order(client=client, count=rng.randint(1, 40), price=0, payment_type='cash')
+            for client in clients
+            for _ in range(2)
+        ], batch_size=2000)
+
+    def measure(self, size, number, repeat):
+        queryset = models.Client.objects.order_by('-created_at').distinct()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            selected = len(ClientFilter({'number': number}, queryset=queryset).qs)
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'clients={size} number={number} selected={selected} '
+            f'best={min(timings) * 1000:.1f}ms worst={max(timings) * 1000:.1f}ms'
+        )
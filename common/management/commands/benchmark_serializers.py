@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+
+from common import models, serializers
+from common.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = 'Compare the DRF serializers with the values() fast path and orjson rendering on the current database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if models.Order.objects.count() < rows:
+            raise CommandError(f'fewer than {rows} orders, run seed_perf_data first')
+
+        cases = [
+            (serializers.ClientOrderListSerializer, serializers.client_order_values, models.Order.objects.order_by('id')),
+            (serializers.OrderListSerializer, serializers.order_values, models.Order.objects.order_by('id')),
+            (serializers.RegionListSerializer, serializers.region_values, models.Region.objects.order_by('id')),
+        ]
+        for serializer_class, values, queryset in cases:
+            queryset = queryset[:rows]
+            slow = self.measure(options['repeat'], lambda: list(queryset.all()), lambda objs: serializer_class(objs, many=True).data, JSONRenderer())
+            fast = self.measure(options['repeat'], lambda: list(values.rows(queryset.all())), values.many, ORJSONRenderer())
+            if slow['output'] != fast['output']:
+                raise CommandError(f'{serializer_class.__name__}: fast path output differs')
+
+            self.stdout.write(f'{serializer_class.__name__} ({slow["rows"]} rows)')
+            for step in ['fetch', 'serialize', 'render', 'total']:
+                self.stdout.write(
+                    f'  {step:<10} drf {slow[step]:8.1f} ms   fast {fast[step]:8.1f} ms   {slow[step] / max(fast[step], 0.001):5.1f}x'
+                )
+
+    def measure(self, repeat, fetch, serialize, renderer):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            objs = fetch()
+            fetched = time.perf_counter()
+            data = serialize(objs)
+            serialized = time.perf_counter()
+            output = renderer.render(data)
+            rendered = time.perf_counter()
+            result = {
+                'rows': len(objs),
+                'fetch': (fetched - started) * 1000,
+                'serialize': (serialized - fetched) * 1000,
+                'render': (rendered - serialized) * 1000,
+                'total': (rendered - started) * 1000,
+                'output': output,
+            }
+            if best is None or result['total'] < best['total']:
+                best = result
+        return best
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from common import exports, filters
+
+
+class Command(BaseCommand):
+    help = 'Stream clients or orders as CSV, e.g. "export orders --filter date_from=2025-05-01 -o may.csv"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['clients', 'orders'])
+        parser.add_argument('-o', '--output')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help='ClientFilter or OrderFilter parameter, may be repeated'
+        )
+
+    def handle(self, *args, **options):
+        data = {}
+        for item in options['filter']:
+            name, _, value = item.partition('=')
+            data[name] = value
+
+        if options['kind'] == 'clients':
+            filterset = filters.ClientFilter(data, queryset=exports.client_queryset().order_by('id'))
+            header, rows = exports.CLIENT_HEADER, exports.client_rows
+        else:
+            filterset = filters.OrderFilter(data, queryset=exports.order_queryset())
+            header, rows = exports.ORDER_HEADER, exports.order_rows
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_json())
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in exports.iter_csv(header, rows(filterset.qs)):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from common import schema
+
+
+class Command(BaseCommand):
+    help = 'Generate the OpenAPI schema served by swagger/; run once per deploy'
+
+    def handle(self, *args, **options):
+        for path in schema.generate():
+            self.stdout.write(self.style.SUCCESS(f'wrote {path}'))
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from common.utils import import_clients
+
+
+class Command(BaseCommand):
+    help = 'Import clients from a CSV or JSONL file in batches; phone_numbers in CSV are separated by ";"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        created = 0
+        failed = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = self.read_jsonl(f) if file_format == 'jsonl' else self.read_csv(f)
+            for batch_created, errors in import_clients(rows, batch_size=options['batch_size']):
+                created += batch_created
+                failed += len(errors)
+                for row, row_errors in errors:
+                    self.stderr.write(f'row {row}: {json.dumps(row_errors, ensure_ascii=False)}')
+                self.stdout.write(f'{created} clients created, {failed} rows failed')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {created} clients created, {failed} rows failed'))
+
+    def read_csv(self, f):
+        for row in csv.DictReader(f):
+            row['phone_numbers'] = [number.strip() for number in (row.get('phone_numbers') or '').split(';') if number.strip()]
+            yield row
+
+    def read_jsonl(self, f):
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise CommandError(f'line {line_number}: {e}')
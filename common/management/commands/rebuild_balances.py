@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from common.balances import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute every client balance (debt, empty bottles, order count, last order) from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('client_ids', nargs='*', type=int)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_balances(options['client_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{rebuilt} client balances rebuilt'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from common.reports import rollup_orders
+
+
+class Command(BaseCommand):
+    help = 'Refresh daily order rollups for the days touched since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='recompute every day instead of only changed ones')
+
+    def handle(self, *args, **options):
+        processed = rollup_orders(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'{processed} days rolled up'))
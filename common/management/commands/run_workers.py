@@ -0,0 +1,55 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from common import jobs
+
+
+def work_process(stop, poll):
+    jobs.work(poll=poll, stop=stop)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs with a pool of worker threads or processes; no broker is needed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll', type=float, default=1.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='run the queued jobs in this process and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = jobs.work(once=True)
+            self.stdout.write(self.style.SUCCESS(f'{processed} jobs processed'))
+            return
+
+        if options['mode'] == 'process':
+            # children must open their own database connections
+            connections.close_all()
+            stop = multiprocessing.Event()
+            workers = [
+                multiprocessing.Process(target=work_process, args=(stop, options['poll']), daemon=True)
+                for _ in range(options['workers'])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=jobs.work, kwargs={'poll': options['poll'], 'stop': stop}, daemon=True)
+                for _ in range(options['workers'])
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write('stopping after the running jobs finish')
+            stop.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'{options["workers"]} {options["mode"]} workers started')
+        for worker in workers:
+            worker.join()
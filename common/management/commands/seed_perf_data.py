@@ -0,0 +1,134 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from common import caching, models, reports, search
+from common.balances import rebuild_balances
+
+
+REGIONS = [
+    'Chilonzor', 'Yunusobod', 'Mirzo Ulug‘bek', 'Yashnobod', 'Olmazor', 'Uchtepa',
+    'Shayxontohur', 'Sergeli', 'Bektemir', 'Mirobod', 'Yakkasaroy', 'Yangihayot',
+]
+FIRST_NAMES = ['Ali', 'Vali', 'Aziz', 'Dilshod', 'Jasur', 'Sardor', 'Nodira', 'Gulnora', 'Malika', 'Shahzod', 'O‘tkir', 'Zarina']
+LAST_NAMES = ['Valiyev', 'Karimov', 'Rahimov', 'Yusupov', 'Toshmatov', 'Qodirov', 'G‘aniyev', 'Ergashev', 'Saidov', 'Xo‘jayev']
+STATUSES = ['delivered'] * 16 + ['new'] * 2 + ['taken', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic regions, clients, phone numbers, trips and orders for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions', type=int, default=len(REGIONS))
+        parser.add_argument('--clients', type=int, default=100_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=365, help='orders are spread over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+
+        regions = self.seed_regions(options['regions'])
+        client_prices = self.seed_clients(regions, options['clients'], options['days'])
+        self.seed_orders(client_prices, options['orders'], options['days'])
+
+        self.stdout.write('rebuilding balances, search documents and rollups')
+        rebuild_balances(client_prices)
+        search.refresh_documents(client_prices)
+        reports.rollup_orders(full=True)
+        caching.invalidate('regions')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {len(regions)} regions, {len(client_prices)} clients, {options["orders"]} orders'
+        ))
+
+    def day_start(self, days_ago):
+        return datetime.combine(self.today - timedelta(days=days_ago), time(8))
+
+    def backdate(self, model, objs, days_ago):
+        # created_at is auto_now_add, so rows are moved to their day after insert;
+        # objs are in day order, so each day is one contiguous id range
+        by_day = {}
+        for obj, day in zip(objs, days_ago):
+            first, last = by_day.get(day, (obj.pk, obj.pk))
+            by_day[day] = (min(first, obj.pk), max(last, obj.pk))
+        for day, (first, last) in by_day.items():
+            created_at = self.day_start(day)
+            model.objects.filter(id__range=(first, last)).update(created_at=created_at, updated_at=created_at)
+
+    def seed_regions(self, count):
+        names = [REGIONS[i % len(REGIONS)] + ('' if i < len(REGIONS) else f' {i // len(REGIONS) + 1}') for i in range(count)]
+        existing = set(models.Region.objects.filter(name__in=names).values_list('name', flat=True))
+        models.Region.objects.bulk_create([models.Region(name=name) for name in names if name not in existing])
+        return list(models.Region.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def seed_clients(self, regions, count, days):
+        rng = self.rng
+        start = (models.Client.objects.aggregate(last=Max('code_number'))['last'] or 0) + 1
+        client_prices = {}
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            days_ago = [days - (offset + i) * days // count for i in range(size)]
+            with transaction.atomic():
+                clients = models.Client.objects.bulk_create([
+                    models.Client(
+                        code_number=start + offset + i,
+                        full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                        region_id=rng.choice(regions),
+                        location_text=f'{rng.randint(1, 40)}-uy, {rng.randint(1, 120)}-xonadon',
+                        cooler=rng.choice(['yes', 'no']),
+                        price=rng.choice([10000, 12000, 15000]),
+                        client_type=rng.choice(['physical_person'] * 9 + ['legal_person']),
+                    )
+                    for i in range(size)
+                ])
+                self.backdate(models.Client, clients, days_ago)
+                models.ClientPhoneNumber.objects.bulk_create([
+                    models.ClientPhoneNumber(client=client, number=f'+99890{rng.randint(0, 9_999_999):07}')
+                    for client in clients
+                    for _ in range(rng.choice([1, 1, 2, 3]))
+                ])
+                models.NumberOfTrips.objects.bulk_create([
+                    models.NumberOfTrips(client=client, number=str(rng.randint(1, 30)))
+                    for client in clients
+                    if rng.random() < 0.3
+                ])
+            client_prices.update((client.id, client.price) for client in clients)
+            self.stdout.write(f'{offset + size} clients created')
+        return client_prices
+
+    def seed_orders(self, client_prices, count, days):
+        rng = self.rng
+        client_ids = list(client_prices)
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            days_ago = [days - (offset + i) * days // count for i in range(size)]
+            orders = []
+            for _ in range(size):
+                client_id = rng.choice(client_ids)
+                order_count = rng.randint(1, 6)
+                price = order_count * client_prices[client_id]
+                order_status = rng.choice(STATUSES)
+                paid = 0 if order_status == 'cancelled' else rng.choice([price, price, price // 2, 0])
+                received = rng.randint(0, order_count) if order_status == 'delivered' else None
+                orders.append(models.Order(
+                    client_id=client_id,
+                    count=order_count,
+                    price=price,
+                    received=received,
+                    the_rest=order_count - received if received is not None else None,
+                    paid=paid,
+                    indebtedness=price - paid if order_status != 'cancelled' else 0,
+                    status=order_status,
+                    payment_type=rng.choice(['cash', 'cash', 'card', 'account_number']),
+                ))
+            with transaction.atomic():
+                models.Order.objects.bulk_create(orders)
+                self.backdate(models.Order, orders, days_ago)
+            self.stdout.write(f'{offset + size} orders created')
@@ -0,0 +1,79 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+
+# In-process registry; every worker process keeps and exposes its own numbers.
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Total request latency.', DURATION_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent running database queries.', DURATION_BUCKETS),
+    'http_request_serialize_duration_seconds': ('Time spent in serializers.', DURATION_BUCKETS),
+    'http_request_encode_duration_seconds': ('Time spent encoding the response body.', DURATION_BUCKETS),
+    'http_request_queries': ('Database queries per request.', QUERY_BUCKETS),
+}
+
+lock = threading.Lock()
+histograms = {}
+requests = defaultdict(int)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def observe(view, method, status, values):
+    with lock:
+        requests[(view, method, status)] += 1
+        for name, value in values.items():
+            key = (name, view, method)
+            if key not in histograms:
+                histograms[key] = Histogram(HISTOGRAMS[name][1])
+            histograms[key].observe(value)
+
+
+def reset():
+    with lock:
+        histograms.clear()
+        requests.clear()
+
+
+def labels(**values):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in values.items()) + '}'
+
+
+def render():
+    # Prometheus text exposition format
+    lines = [
+        '# HELP http_requests_total Requests by view, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    with lock:
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{labels(view=view, method=method, status=status)} {count}')
+
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, view, method), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{labels(view=view, method=method, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{labels(view=view, method=method)} {histogram.sum}')
+                lines.append(f'{name}_count{labels(view=view, method=method)} {histogram.count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,210 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cached_property
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from common import metrics, routers
+
+
+logger = logging.getLogger('common.requests')
+
+# the RequestTimer of the request being handled; sync_to_async copies it
+# into the thread that runs the ORM calls of async views
+current_timer = ContextVar('current_timer', default=None)
+
+
+class RequestTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.serialize = 0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def time_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_timer(connection):
+    # called from common.signals for every new connection, in whichever
+    # thread opens it
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@contextmanager
+def timed_serialization():
+    # only the outermost serializer is timed, so a serializer that builds
+    # another one's .data is not counted twice
+    timer = current_timer.get()
+    if timer is None or timer.serializing:
+        yield
+        return
+    timer.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.serialize += time.perf_counter() - started
+        timer.serializing = False
+
+
+def install_serializer_timer():
+    # called from CommonConfig.ready(); every view, generic or not, turns its
+    # serializer into primitives through .data
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if getattr(cls.data.fget, 'timed', False):
+            continue
+
+        def data(self, fget=cls.data.fget):
+            with timed_serialization():
+                return fget(self)
+
+        data.timed = True
+        cls.data = property(data, doc=cls.data.__doc__)
+
+
+class InstrumentationMiddleware:
+    """
+    Records query count, DB time, time spent serializing (serializer .data and
+    ValuesSerializer, including the queries they trigger), time spent
+    encoding the response body and total latency of every request, sends
+    them back as a Server-Timing header, feeds the metrics/ histograms and
+    logs requests slower than SLOW_REQUEST_MS. Works under WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @cached_property
+    def view_names(self):
+        from common import urls
+
+        return {pattern.name for pattern in urls.urlpatterns if pattern.name}
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = RequestTimer()
+        token = current_timer.set(timer)
+        request._encode_time = 0
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.record(request, response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = current_timer.set(timer)
+        request._encode_time = 0
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.record(request, response, timer, time.perf_counter() - started)
+
+    def record(self, request, response, timer, total):
+        match = request.resolver_match
+        if match is not None and match.url_name == 'metrics':
+            return response
+        view = match.url_name if match is not None and match.url_name in self.view_names else 'other'
+
+        encode = request._encode_time
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"',
+            f'serialize;dur={timer.serialize * 1000:.1f}',
+            f'encode;dur={encode * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        metrics.observe(view, request.method, response.status_code, {
+            'http_request_duration_seconds': total,
+            'http_request_db_duration_seconds': timer.duration,
+            'http_request_serialize_duration_seconds': timer.serialize,
+            'http_request_encode_duration_seconds': encode,
+            'http_request_queries': timer.count,
+        })
+
+        if total * 1000 >= getattr(settings, 'SLOW_REQUEST_MS', 500):
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timer.count,
+                'db_ms': round(timer.duration * 1000, 1),
+                'serialize_ms': round(timer.serialize * 1000, 1),
+                'encode_ms': round(encode * 1000, 1),
+                'total_ms': round(total * 1000, 1),
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are encoded by response.render() after the view
+        # returns; time that step
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._encode_time += time.perf_counter() - started
+
+        response.render = timed_render
+        return response
+
+
+class ReplicaPinMiddleware:
+    # after a successful write, keep this client's reads on the primary until
+    # the replicas have caught up
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and routers.replicas():
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5), httponly=True,
+                samesite='Lax',
+            )
+        return response
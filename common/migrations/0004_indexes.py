@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+# icontains on PostgreSQL compiles to UPPER(column::text) LIKE UPPER(...),
+# so the trigram indexes are built on that same expression.
+TRIGRAM_INDEXES = [
+    ('client_full_name_trgm_idx', 'common_client', 'full_name'),
+    ('client_code_number_trgm_idx', 'common_client', 'code_number'),
+    ('phone_number_trgm_idx', 'common_clientphonenumber', 'number'),
+    ('number_of_trips_number_trgm_idx', 'common_numberoftrips', 'number'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_alter_order_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['-created_at'], name='client_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['client', '-created_at'], name='order_client_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'client'], name='order_status_client_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
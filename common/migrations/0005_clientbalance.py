@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_balances(apps, schema_editor):
+    Client = apps.get_model('common', 'Client')
+    Order = apps.get_model('common', 'Order')
+    ClientBalance = apps.get_model('common', 'ClientBalance')
+
+    totals = {
+        row['client']: row
+        for row in Order.objects.values('client').annotate(
+            total_debt=models.Sum('indebtedness'),
+            empty_bottles=models.Sum('the_rest'),
+            orders_count=models.Count('id'),
+            last_order=models.Max('id'),
+        ).order_by()
+    }
+    statuses = dict(Order.objects.filter(id__in=[row['last_order'] for row in totals.values()]).values_list('id', 'status'))
+    balances = []
+    for client_id in Client.objects.values_list('id', flat=True).iterator():
+        row = totals.get(client_id, {})
+        balances.append(ClientBalance(
+            client_id=client_id,
+            total_debt=row.get('total_debt') or 0,
+            empty_bottles=row.get('empty_bottles') or 0,
+            orders_count=row.get('orders_count', 0),
+            last_order_id=row.get('last_order'),
+            last_order_status=statuses.get(row.get('last_order'), ''),
+        ))
+    ClientBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientBalance',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='common.client')),
+                ('total_debt', models.BigIntegerField(default=0)),
+                ('empty_bottles', models.BigIntegerField(default=0)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('last_order_status', models.CharField(blank=True, choices=[('new', 'new'), ('delivered', 'delivered'), ('cancelled', 'cancelled'), ('taken', 'taken')], max_length=15)),
+                ('last_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='common.order')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
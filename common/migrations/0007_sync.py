@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['updated_at'], name='client_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientphonenumber',
+            index=models.Index(fields=['updated_at'], name='phone_number_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='numberoftrips',
+            index=models.Index(fields=['updated_at'], name='number_of_trips_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['created_at'], name='tombstone_created_at_idx'),
+        ),
+    ]
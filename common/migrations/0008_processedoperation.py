@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0007_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('result', models.JSONField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
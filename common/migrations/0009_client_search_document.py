@@ -0,0 +1,92 @@
+# Generated by Django 5.2 on 2026-10-18 15:33
+
+import re
+
+from django.db import migrations, models
+
+
+# frozen copies of common.search.normalize/digits/build_document as they were
+# when this migration was written
+APOSTROPHES = re.compile("[‘’ʻʼ`´]")
+
+
+def build_document(full_name, code_number, phone_numbers):
+    name = ' '.join(APOSTROPHES.sub("'", str(full_name)).lower().split())
+    numbers = [''.join(char for char in number if char.isdigit()) for number in phone_numbers]
+    return ' '.join([name, str(code_number)] + numbers)
+
+
+# the 0004 UPPER(...) trigram indexes served icontains searches that the
+# search document replaces
+OLD_TRIGRAM_INDEXES = [
+    ('client_full_name_trgm_idx', 'common_client', 'full_name'),
+    ('client_code_number_trgm_idx', 'common_client', 'code_number'),
+    ('phone_number_trgm_idx', 'common_clientphonenumber', 'number'),
+]
+
+
+def populate_search_documents(apps, schema_editor):
+    Client = apps.get_model('common', 'Client')
+    ClientPhoneNumber = apps.get_model('common', 'ClientPhoneNumber')
+
+    last_id = 0
+    while True:
+        clients = list(Client.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not clients:
+            return
+        numbers = {}
+        for client_id, number in ClientPhoneNumber.objects.filter(client__in=clients).values_list('client', 'number'):
+            numbers.setdefault(client_id, []).append(number)
+        for client in clients:
+            client.search_document = build_document(client.full_name, client.code_number, numbers.get(client.id, []))
+        Client.objects.bulk_update(clients, ['search_document'])
+        last_id = clients[-1].id
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS "client_search_document_trgm_idx" ON "common_client" USING gin ("search_document" gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "client_search_document_trgm_idx"')
+
+
+def drop_old_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in OLD_TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def restore_old_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in OLD_TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0008_processedoperation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.RunPython(drop_old_trigram_indexes, restore_old_trigram_indexes),
+    ]
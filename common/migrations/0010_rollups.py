@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0009_client_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('watermark', models.DateTimeField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('payment_type', models.CharField(choices=[('card', 'card'), ('cash', 'cash'), ('account_number', 'account_number')], max_length=50)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('bottles_delivered', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('new_debt', models.BigIntegerField(default=0)),
+                ('empty_bottles', models.BigIntegerField(default=0)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='common.region')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'region', 'payment_type'), name='daily_order_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models 
+from django.utils import timezone
 
 class BaseModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True 
@@ -28,6 +30,13 @@ class Client(BaseModel):
     cooler = models.CharField(max_length=50)
     price = models.PositiveBigIntegerField()
     client_type = models.CharField(max_length=50, choices=CLIENT_TYPE)
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='client_created_at_idx'),
+            models.Index(fields=['updated_at'], name='client_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -37,6 +46,11 @@ class ClientPhoneNumber(BaseModel):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='numbers')
     number = models.CharField(max_length=15)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='phone_number_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.number
 
@@ -64,6 +78,13 @@ class Order(BaseModel):
     status = models.CharField(max_length=15, choices=STATUS, default='new')
     payment_type = models.CharField(max_length=50, choices=PAYMENT_TYPE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', '-created_at'], name='order_client_created_at_idx'),
+            models.Index(fields=['status', 'client'], name='order_status_client_idx'),
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ]
+
     def __str__(self):
         return f'{self.client} - {self.count} - {self.price}'
 
@@ -72,7 +93,103 @@ class NumberOfTrips(BaseModel):
     number = models.CharField(max_length=50)
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='number_of_trips')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='number_of_trips_updated_at_idx'),
+        ]
+
     def __str__(self):
         return "{} - {}".format(self.client, self.number)
-    
-    
\ No newline at end of file
+
+
+class ClientBalance(BaseModel):
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    total_debt = models.BigIntegerField(default=0)
+    empty_bottles = models.BigIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    last_order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_order_status = models.CharField(max_length=15, choices=Order.STATUS, blank=True)
+
+    def __str__(self):
+        return f'{self.client} - {self.total_debt}'
+
+
+class Tombstone(BaseModel):
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    date = models.DateField(null=True, blank=True)  # day of a deleted order, for the report rollups
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='tombstone_created_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} - {self.object_id}'
+
+
+class ProcessedOperation(BaseModel):
+    key = models.CharField(max_length=100, unique=True)
+    result = models.JSONField()
+
+    def __str__(self):
+        return self.key
+
+
+class DailyOrderRollup(BaseModel):
+    date = models.DateField()
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='rollups')
+    payment_type = models.CharField(max_length=50, choices=Order.PAYMENT_TYPE)
+    orders_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    bottles_delivered = models.PositiveBigIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+    new_debt = models.BigIntegerField(default=0)
+    empty_bottles = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'region', 'payment_type'], name='daily_order_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} - {self.region} - {self.payment_type}'
+
+
+class RollupWatermark(BaseModel):
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} - {self.watermark}'
+
+
+class Job(BaseModel):
+    STATUS = (
+        ('queued', 'queued'),
+        ('running', 'running'),
+        ('succeeded', 'succeeded'),
+        ('failed', 'failed'),
+    )
+
+    name = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=15, choices=STATUS, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id} - {self.status}'
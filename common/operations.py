@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.utils import timezone
+
+from common import balances, models
+
+
+ORDER_FIELDS = ['received', 'the_rest', 'status', 'paid', 'indebtedness', 'payment_type', 'updated_at']
+
+
+def apply_delivery(order, operation):
+    if operation['received'] > order.count:
+        return 'received is greater than count'
+    order.received = operation['received']
+    order.the_rest = order.count - order.received
+    order.status = 'delivered'
+
+
+def apply_cancel(order, operation):
+    order.status = 'cancelled'
+
+
+def apply_payment(order, operation):
+    order.paid = (order.paid or 0) + operation['amount']
+    order.indebtedness = (order.indebtedness or 0) - operation['amount']
+    order.payment_type = operation.get('payment_type', order.payment_type)
+
+
+HANDLERS = {
+    'delivery': apply_delivery,
+    'cancel': apply_cancel,
+    'payment': apply_payment,
+}
+
+
+def order_result(order):
+    return {
+        'id': order.id, 'status': order.status, 'received': order.received, 'the_rest': order.the_rest,
+        'paid': order.paid, 'indebtedness': order.indebtedness, 'payment_type': order.payment_type,
+    }
+
+
+def apply_operations(operations):
+    # Operations are applied in order inside one transaction. A key that was
+    # already processed, earlier in this batch or in a previous request,
+    # returns its stored result instead of being applied again.
+    keys = [operation['key'] for operation in operations]
+    with transaction.atomic():
+        processed = dict(models.ProcessedOperation.objects.filter(key__in=keys).values_list('key', 'result'))
+        orders = models.Order.objects.select_for_update().in_bulk(
+            {operation['order_id'] for operation in operations if operation['key'] not in processed}
+        )
+
+        results = []
+        new = {}
+        changed = {}
+        now = timezone.now()
+        for operation in operations:
+            key = operation['key']
+            if key in processed or key in new:
+                results.append(dict(processed.get(key) or new[key], replayed=True))
+                continue
+
+            order = orders.get(operation['order_id'])
+            if order is None:
+                result = {'key': key, 'success': False, 'error': 'order not found'}
+            else:
+                error = HANDLERS[operation['type']](order, operation)
+                if error:
+                    result = {'key': key, 'success': False, 'error': error}
+                else:
+                    order.updated_at = now
+                    changed[order.id] = order
+                    result = {'key': key, 'success': True, 'order': order_result(order)}
+            new[key] = result
+            results.append(result)
+
+        models.Order.objects.bulk_update(changed.values(), ORDER_FIELDS)
+        balances.rebuild_balances({order.client_id for order in changed.values()})
+        models.ProcessedOperation.objects.bulk_create(
+            [models.ProcessedOperation(key=key, result=result) for key, result in new.items()]
+        )
+    return results
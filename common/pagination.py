@@ -0,0 +1,49 @@
+from rest_framework import pagination
+
+
+class CreatedAtCursorPagination(pagination.CursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class CursorOrPageNumberPagination(pagination.BasePagination):
+    # page numbers stay the default for the admin UI; apps opt into keyset
+    # pagination with ?pagination=cursor and then follow the "next" links
+    mode_query_param = 'pagination'
+    cursor_pagination_class = CreatedAtCursorPagination
+    page_number_pagination_class = pagination.PageNumberPagination
+    # searches are ordered by relevance, which a created_at cursor would
+    # throw away, so they always get page numbers
+    ranked_query_param = 'search'
+
+    def get_paginator(self, request):
+        if request.query_params.get(self.ranked_query_param):
+            return self.page_number_pagination_class()
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_pagination_class.cursor_query_param in request.query_params
+        ):
+            return self.cursor_pagination_class()
+        return self.page_number_pagination_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_pagination_class().get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.page_number_pagination_class().get_schema_operation_parameters(view)
+            + self.cursor_pagination_class().get_schema_operation_parameters(view)
+        )
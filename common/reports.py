@@ -0,0 +1,100 @@
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from common import models
+from common.sync import OVERLAP, SYNCED_MODELS
+
+
+WATERMARK = 'orders'
+METRICS = ['orders_count', 'cancelled_count', 'bottles_delivered', 'revenue', 'new_debt', 'empty_bottles']
+GROUPS = ['date', 'region', 'payment_type']
+
+
+def changed_dates(since):
+    # an order's day never changes, so recomputing the days of every order
+    # touched since the watermark (or whose client moved region) is enough
+    orders = models.Order.objects.all()
+    if since is not None:
+        orders = orders.filter(Q(updated_at__gt=since) | Q(client__updated_at__gt=since))
+    return orders.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct().order_by('day')
+
+
+def deleted_dates(since):
+    # deleted orders, including cascades from deleted clients, leave a tombstone
+    return models.Tombstone.objects.filter(
+        model=SYNCED_MODELS[models.Order], created_at__gt=since, date__isnull=False
+    ).values_list('date', flat=True).distinct()
+
+
+def rollup_dates(dates):
+    not_cancelled = ~Q(status='cancelled')
+    rows = models.Order.objects.filter(
+        created_at__gte=datetime.combine(min(dates), time.min),
+        created_at__lt=datetime.combine(max(dates) + timedelta(days=1), time.min),
+    ).annotate(day=TruncDate('created_at')).filter(day__in=dates).values(
+        'day', 'client__region', 'payment_type'
+    ).annotate(
+        orders_count=Count('id'),
+        cancelled_count=Count('id', filter=Q(status='cancelled')),
+        bottles_delivered=Coalesce(Sum('count', filter=Q(status='delivered')), 0),
+        revenue=Coalesce(Sum('paid', filter=not_cancelled), 0),
+        new_debt=Coalesce(Sum('indebtedness', filter=not_cancelled), 0),
+        empty_bottles=Coalesce(Sum('the_rest', filter=not_cancelled), 0),
+    ).order_by()
+    with transaction.atomic():
+        models.DailyOrderRollup.objects.filter(date__in=dates).delete()
+        models.DailyOrderRollup.objects.bulk_create([
+            models.DailyOrderRollup(
+                date=row['day'], region_id=row['client__region'], payment_type=row['payment_type'],
+                **{metric: row[metric] for metric in METRICS}
+            )
+            for row in rows
+        ])
+
+
+def rollup_orders(full=False, batch_size=31):
+    started = timezone.now()
+    state = models.RollupWatermark.objects.filter(name=WATERMARK).first()
+    since = None if full or state is None else state.watermark
+
+    dates = set(changed_dates(since))
+    if since is not None:
+        dates.update(deleted_dates(since))
+    dates = iter(sorted(dates))
+    processed = 0
+    while batch := list(islice(dates, batch_size)):
+        rollup_dates(batch)
+        processed += len(batch)
+    if full:
+        models.DailyOrderRollup.objects.exclude(date__in=changed_dates(None)).delete()
+
+    models.RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'watermark': started - OVERLAP})
+    return processed
+
+
+def report(date_from, date_to, group_by=(), region=None, payment_type=None):
+    rollups = models.DailyOrderRollup.objects.filter(date__range=(date_from, date_to))
+    if region is not None:
+        rollups = rollups.filter(region=region)
+    if payment_type is not None:
+        rollups = rollups.filter(payment_type=payment_type)
+
+    fields = [group for group in GROUPS if group in group_by]
+    sums = {f'sum_{metric}': Sum(metric) for metric in METRICS}
+    if fields:
+        rows = rollups.values(*fields).annotate(**sums).order_by(*fields)
+    else:
+        rows = [rollups.aggregate(**sums)]
+
+    result = []
+    for row in rows:
+        item = {field: row[field] for field in fields}
+        item.update({metric: row[f'sum_{metric}'] or 0 for metric in METRICS})
+        item['cancellation_rate'] = item['cancelled_count'] / item['orders_count'] if item['orders_count'] else 0
+        result.append(item)
+    return result
@@ -0,0 +1,61 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Reads go to a replica only inside use_replica(), which ReplicaReadMixin
+# enters for safe requests of the views that opt in. Everything else,
+# including reads inside a transaction on the primary, stays on 'default'.
+# One replica is picked per use_replica() block so that every query of a
+# request (a COUNT and its page, say) sees the same replication lag.
+
+PIN_COOKIE = 'db_pin'
+
+current_replica = ContextVar('current_replica', default=None)
+
+
+def replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+@contextmanager
+def use_replica():
+    aliases = replicas()
+    token = current_replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+def pinned(request):
+    # set by ReplicaPinMiddleware for a few seconds after the client wrote
+    return bool(request.COOKIES.get(PIN_COOKIE))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_replica.get()
+        if alias is None or connections['default'].in_atomic_block or alias not in replicas():
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS and not pinned(request):
+            with use_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
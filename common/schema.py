@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+
+import drf_yasg
+import rest_framework
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import URLResolver, get_resolver
+
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+
+from common.permissions import IsStaffOr404
+
+
+# The OpenAPI document only changes when the code does, so it is generated
+# once per deploy (generate_schema, or the first swagger request if that was
+# skipped), written to OPENAPI_SCHEMA_ROOT under a hash of the URLconf, the
+# project's source files and the DRF/drf_yasg versions, and served from
+# there as static JSON/YAML.
+
+INFO = openapi.Info(
+    title="Musaffo Suv Crm",
+    default_version='version 1',
+    description='this is first version of musaffo water crm',
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+CODECS = {'json': OpenAPICodecJson, 'yaml': OpenAPICodecYaml}
+
+lock = threading.Lock()
+documents = {}  # (schema version, format) -> bytes, per process
+
+
+def routes(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        else:
+            view = getattr(pattern.callback, 'cls', None) or pattern.callback
+            yield f'{prefix}{pattern.pattern} {pattern.name} {view.__module__}.{view.__qualname__}'
+
+
+def source_files():
+    # every module of the project's own apps; serializers, filters and
+    # docstrings all end up in the schema
+    root = os.path.realpath(settings.BASE_DIR)
+    for directory in sorted({os.path.realpath(app.path) for app in apps.get_app_configs()}):
+        if not directory.startswith(root) or 'site-packages' in directory:
+            continue
+        for parent, dirs, files in os.walk(directory):
+            dirs.sort()
+            yield from (os.path.join(parent, name) for name in sorted(files) if name.endswith('.py'))
+
+
+@lru_cache
+def schema_version():
+    # neither the URLconf nor the code changes while a process runs
+    digest = hashlib.md5(f'{rest_framework.__version__} {drf_yasg.__version__}'.encode())
+    digest.update('\n'.join(routes(get_resolver().url_patterns)).encode())
+    for path in source_files():
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def schema_root():
+    return getattr(settings, 'OPENAPI_SCHEMA_ROOT', os.path.join(settings.BASE_DIR, 'schema'))
+
+
+def schema_path(fmt, version=None):
+    return os.path.join(schema_root(), f'openapi-{version or schema_version()}.{fmt}')
+
+
+def generate():
+    """
+    Generate the schema, write every format next to each other and drop the
+    files of older versions. Returns the written paths.
+    """
+    schema = OpenAPISchemaGenerator(INFO).get_schema(request=None, public=True)
+    version = schema_version()
+    os.makedirs(schema_root(), exist_ok=True)
+    paths = []
+    for fmt, codec in CODECS.items():
+        content = codec(validators=[]).encode(schema)
+        path = schema_path(fmt, version)
+        # written under a temporary name so readers never see half a file
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(f'{path}.tmp', path)
+        documents[version, fmt] = content
+        paths.append(path)
+
+    for name in os.listdir(schema_root()):
+        if name.startswith('openapi-') and not name.startswith(f'openapi-{version}.'):
+            os.remove(os.path.join(schema_root(), name))
+    return paths
+
+
+def load(fmt):
+    version = schema_version()
+    content = documents.get((version, fmt))
+    if content is None:
+        with lock:
+            if (version, fmt) not in documents:
+                try:
+                    with open(schema_path(fmt, version), 'rb') as f:
+                        documents[version, fmt] = f.read()
+                except FileNotFoundError:
+                    generate()
+            content = documents[version, fmt]
+    return content
+
+
+class SchemaView(get_schema_view(info=INFO, public=True, permission_classes=(IsStaffOr404,))):
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        if not hasattr(renderer, 'codec_class'):
+            # the swagger UI page itself; it fetches the document below
+            return super().get(request, version, format)
+
+        content = load('yaml' if renderer.codec_class is OpenAPICodecYaml else 'json')
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return HttpResponseNotModified(headers={'ETag': etag})
+        response = HttpResponse(content, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,65 @@
+import re
+from itertools import islice
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from common import models
+
+
+APOSTROPHES = re.compile("[‘’ʻʼ`´]")
+PHONE = re.compile(r'[\d\s()+-]+')
+
+
+def normalize(text):
+    return ' '.join(APOSTROPHES.sub("'", str(text)).lower().split())
+
+
+def digits(text):
+    return ''.join(char for char in text if char.isdigit())
+
+
+def build_document(full_name, code_number, phone_numbers):
+    # name, code number and digits-only phone numbers, e.g. "ali valiyev 1024 998901112233"
+    return ' '.join([normalize(full_name), str(code_number)] + [digits(number) for number in phone_numbers])
+
+
+def refresh_documents(client_ids, batch_size=1000):
+    client_ids = iter(client_ids)
+    while batch := list(islice(client_ids, batch_size)):
+        clients = models.Client.objects.filter(id__in=batch).only('id', 'full_name', 'code_number', 'search_document')
+        numbers = {}
+        for client_id, number in models.ClientPhoneNumber.objects.filter(client__in=batch).values_list('client', 'number'):
+            numbers.setdefault(client_id, []).append(number)
+        for client in clients:
+            client.search_document = build_document(client.full_name, client.code_number, numbers.get(client.id, []))
+        models.Client.objects.bulk_update(clients, ['search_document'])
+
+
+def search(queryset, value):
+    term = normalize(value)
+    if not term:
+        return queryset
+    if PHONE.fullmatch(term):
+        term = digits(term)
+        if not term:
+            # only phone punctuation, e.g. "+-"; the empty term would match
+            # every client
+            return queryset.none()
+
+    rank = Case(
+        When(search_document__startswith=term, then=Value(3)),
+        When(search_document__contains=' ' + term, then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    if term.isdigit():
+        rank = Case(When(code_number=int(term), then=Value(4)), default=rank, output_field=IntegerField())
+    queryset = queryset.filter(search_document__contains=term).annotate(search_rank=rank)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(search_similarity=TrigramWordSimilarity(term, 'search_document'))
+        return queryset.order_by('-search_rank', '-search_similarity', '-created_at', '-id')
+    return queryset.order_by('-search_rank', '-created_at', '-id')
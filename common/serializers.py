@@ -1,9 +1,10 @@
 from django.db import transaction
-from django.db.models import Sum
+from django.utils import timezone
 
 from rest_framework import serializers
 
-from common import models
+from common import balances, models, search
+from common.middleware import timed_serialization
 
 
 class ClientCreateSerializer(serializers.Serializer):
@@ -37,30 +38,60 @@ class ClientCreateSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         with transaction.atomic():
-            client = models.Client.objects.create(
-                full_name=validated_data['full_name'],
-                code_number=validated_data['code_number'],
-                region=validated_data['region'],
-                location_text=validated_data['location_text'],
-                cooler=validated_data['cooler'],    
-                price=validated_data['capsule_price'],
-                client_type=validated_data['client_type'],
-                debt=(validated_data['capsule_price'] * validated_data['order_count']) - validated_data['paid']
-            )  
-            for phone in validated_data['phone_numbers']:
-                models.ClientPhoneNumber.objects.create(number=phone, client=client)
-            
-            order = models.Order.objects.create(
-                client=client,
-                count=validated_data['order_count'],
-                price=validated_data['capsule_price'] * validated_data['order_count'],
-                paid=validated_data['paid'],
-                the_rest=validated_data['order_count'],
-                indebtedness=(validated_data['capsule_price'] * validated_data['order_count']) - validated_data['paid'],
-                payment_type=validated_data['payment_type'],
-            )
+            client = self.build_client(validated_data)
+            client.save()
+            models.ClientPhoneNumber.objects.bulk_create(self.build_numbers(client, validated_data))
+            order = self.build_order(client, validated_data)
+            order.save()
+            balances.build_balance(client, order).save()
             return order
-        
+
+    @staticmethod
+    def build_client(validated_data):
+        return models.Client(
+            full_name=validated_data['full_name'],
+            code_number=validated_data['code_number'],
+            region=validated_data['region'],
+            location_text=validated_data['location_text'],
+            cooler=validated_data['cooler'],    
+            price=validated_data['capsule_price'],
+            client_type=validated_data['client_type'],
+            debt=(validated_data['capsule_price'] * validated_data['order_count']) - validated_data['paid'],
+            search_document=search.build_document(
+                validated_data['full_name'], validated_data['code_number'], validated_data['phone_numbers']
+            ),
+        )
+
+    @staticmethod
+    def build_numbers(client, validated_data):
+        return [models.ClientPhoneNumber(number=phone, client=client) for phone in validated_data['phone_numbers']]
+
+    @staticmethod
+    def build_order(client, validated_data):
+        return models.Order(
+            client=client,
+            count=validated_data['order_count'],
+            price=validated_data['capsule_price'] * validated_data['order_count'],
+            paid=validated_data['paid'],
+            the_rest=validated_data['order_count'],
+            indebtedness=(validated_data['capsule_price'] * validated_data['order_count']) - validated_data['paid'],
+            payment_type=validated_data['payment_type'],
+        )
+
+
+class ClientImportSerializer(ClientCreateSerializer):
+    # regions and code_numbers are preloaded once per batch by utils.import_clients
+    def validate_region(self, region):
+        try:
+            return self.context['regions'][region]
+        except KeyError:
+            raise serializers.ValidationError('region not found')
+
+    def validate_code_number(self, code_number):
+        if code_number in self.context['code_numbers']:
+            raise serializers.ValidationError('client already exists')
+        return code_number
+
     
 class RegionListSerializer(serializers.ModelSerializer):
     class Meta:
@@ -117,6 +148,7 @@ class ClientOrderCreateSerializer(serializers.Serializer):
                 indebtedness=validated_data['indebtedness'],
                 payment_type=validated_data['payment_type'],
             )
+            balances.record_order_created(order)
             return ClientOrderListSerializer(order).data
         
 
@@ -128,12 +160,19 @@ class ClientPhoneNumberSerializer(serializers.ModelSerializer):
         ]
 
 
+class BalanceField(serializers.IntegerField):
+    # clients that have no balance row yet have nothing ordered
+    def get_attribute(self, instance):
+        value = super().get_attribute(instance)
+        return 0 if value is None else value
+
+
 class ClientDetailSerializer(serializers.ModelSerializer):
     region = RegionListSerializer()
-    numbers = serializers.SerializerMethodField(method_name='get_numbers')
-    orders_count = serializers.SerializerMethodField(method_name='get_orders_count')
-    empty_dish = serializers.SerializerMethodField(method_name='get_empty_dish')
-    all_debt = serializers.SerializerMethodField(method_name='get_all_debt')
+    numbers = ClientPhoneNumberSerializer(many=True)
+    orders_count = BalanceField(source='balance.orders_count', read_only=True)
+    empty_dish = BalanceField(source='balance.empty_bottles', read_only=True)
+    all_debt = BalanceField(source='balance.total_debt', read_only=True)
 
     class Meta:
         model = models.Client
@@ -141,30 +180,13 @@ class ClientDetailSerializer(serializers.ModelSerializer):
             'id', 'code_number', 'full_name', 'region', 'numbers', 'cooler', 'location_text', 'orders_count', 'empty_dish', 'all_debt', 'price', 'client_type'
         ]
 
-    def get_numbers(self, obj):
-        numbers = models.ClientPhoneNumber.objects.filter(client=obj)
-        return ClientPhoneNumberSerializer(numbers, many=True).data
-    
-    def get_orders_count(self, obj):
-        return models.Order.objects.filter(client=obj).count()
-    
-    def get_empty_dish(self, obj):
-        return models.Order.objects.filter(client=obj).aggregate(
-            empty_dish=Sum('the_rest')
-        )['empty_dish']
-        
-    def get_all_debt(self, obj):
-        return models.Order.objects.filter(client=obj).aggregate(
-            all_debt=Sum('indebtedness')
-        )['all_debt']
-
 
 class ClientListSerializer(serializers.ModelSerializer):
     region = RegionListSerializer()
-    numbers = serializers.SerializerMethodField(method_name='get_numbers')
+    numbers = ClientPhoneNumberSerializer(many=True)
     order = serializers.SerializerMethodField(method_name='get_order')
     number_of_trips = serializers.SerializerMethodField(method_name='get_number_of_trips')
-    all_debt = serializers.SerializerMethodField(method_name='get_all_debt')
+    all_debt = BalanceField(source='balance.total_debt', read_only=True)
 
 
     class Meta:
@@ -173,28 +195,19 @@ class ClientListSerializer(serializers.ModelSerializer):
             'id', 'code_number', 'full_name', 'region', 'numbers', 'cooler', 'location_text', 'order', 'client_type', 'number_of_trips', 'all_debt'
         ]
 
-    def get_numbers(self, obj):
-        numbers = models.ClientPhoneNumber.objects.filter(client=obj)
-        return ClientPhoneNumberSerializer(numbers, many=True).data
-    
     def get_order(self, obj):
-        order =  models.Order.objects.filter(client=obj).last()
-        return OrderListSerializer(order).data
+        balance = getattr(obj, 'balance', None)
+        return order_values.instance(balance.last_order if balance else None)
 
     def get_number_of_trips(self, obj):
-        number_of_trips = models.NumberOfTrips.objects.filter(client=obj).last()
-        if number_of_trips:
+        if obj.latest_number_of_trips:
+            number_of_trips = obj.latest_number_of_trips[0]
             return {"id": number_of_trips.id, "number": number_of_trips.number}
         else:
             return None 
         
-    def get_all_debt(self, obj):
-        return models.Order.objects.filter(client=obj).aggregate(
-            all_debt=Sum('indebtedness')
-        )['all_debt']
-        
 class ClientUpdateSerializer(serializers.ModelSerializer):
-    numbers = ClientPhoneNumberSerializer(many=True)
+    numbers = ClientPhoneNumberSerializer(many=True, required=False)
 
     class Meta:
         model = models.Client
@@ -204,21 +217,103 @@ class ClientUpdateSerializer(serializers.ModelSerializer):
 
 
     def update(self, instance, validated_data):
-        numbers_data = validated_data.pop('numbers', [])
-
-        instance.code_number = validated_data.get('code_number', instance.code_number)
-        instance.full_name = validated_data.get('full_name', instance.full_name)
-        instance.region = validated_data.get('region', instance.region)
-        instance.cooler = validated_data.get('cooler', instance.cooler)
-        instance.location_text = validated_data.get('location_text', instance.location_text)
-        instance.client_type = validated_data.get('client_type', instance.client_type)
-        instance.price = validated_data.get('price', instance.price)
-        models.ClientPhoneNumber.objects.filter(client=instance).delete()
-        for number_data in numbers_data:
-            models.ClientPhoneNumber.objects.update_or_create(client=instance, number=number_data['number'])
-        instance.save()
+        self.apply_changes([(instance, validated_data)])
         return instance
-    
+
+    @staticmethod
+    def apply_changes(changes):
+        """
+        Apply [(client, validated_data), ...]: only fields whose value differs
+        are written, and submitted numbers are diffed against the stored ones
+        so that unchanged rows keep their ids. A missing `numbers` key leaves
+        the numbers alone.
+        """
+        existing = {}
+        for number_id, client_id, number in models.ClientPhoneNumber.objects.filter(
+            client__in=[client.id for client, data in changes]
+        ).values_list('id', 'client', 'number'):
+            # a number may be stored more than once, see ClientCreateSerializer
+            existing.setdefault(client_id, {}).setdefault(number, []).append(number_id)
+
+        created = []
+        deleted = []
+        updated = []
+        for client, data in changes:
+            fields = []
+            for name, value in data.items():
+                if name == 'numbers':
+                    continue
+                field = models.Client._meta.get_field(name)
+                if field.is_relation:
+                    name, value = field.attname, value.pk
+                if getattr(client, name) != value:
+                    setattr(client, name, value)
+                    fields.append(name)
+
+            current = existing.get(client.id, {})
+            numbers = list(current)
+            if data.get('numbers') is not None:
+                numbers = list(dict.fromkeys(number['number'] for number in data['numbers']))
+                for number, number_ids in current.items():
+                    # dropped numbers go entirely, kept ones lose their extra copies
+                    deleted.extend(number_ids if number not in numbers else number_ids[1:])
+                created.extend(
+                    models.ClientPhoneNumber(client=client, number=number) for number in numbers if number not in current
+                )
+
+            document = search.build_document(client.full_name, client.code_number, numbers)
+            if document != client.search_document:
+                client.search_document = document
+                fields.append('search_document')
+            if fields:
+                updated.append((client, fields))
+
+        with transaction.atomic():
+            if deleted:
+                models.ClientPhoneNumber.objects.filter(id__in=deleted).delete()
+            if created:
+                models.ClientPhoneNumber.objects.bulk_create(created)
+            if len(updated) == 1:
+                client, fields = updated[0]
+                client.save(update_fields=fields + ['updated_at'])
+            elif updated:
+                now = timezone.now()
+                fields = set()
+                for client, client_fields in updated:
+                    client.updated_at = now
+                    fields.update(client_fields)
+                models.Client.objects.bulk_update([client for client, client_fields in updated], [*fields, 'updated_at'])
+        return len(updated)
+
+
+class ClientBulkUpdateSerializer(ClientUpdateSerializer):
+    # clients, regions and code_numbers are preloaded once by utils.update_clients
+    id = serializers.IntegerField()
+    region = serializers.IntegerField(required=False)
+    code_number = serializers.IntegerField(min_value=0, required=False)
+
+    class Meta(ClientUpdateSerializer.Meta):
+        fields = ['id'] + ClientUpdateSerializer.Meta.fields
+
+    def validate_id(self, id):
+        if id not in self.context['clients']:
+            raise serializers.ValidationError('client not found')
+        return id
+
+    def validate_region(self, region):
+        try:
+            return self.context['regions'][region]
+        except KeyError:
+            raise serializers.ValidationError('region not found')
+
+    def validate(self, attrs):
+        if 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required.'})
+        owner = self.context['code_numbers'].get(attrs.get('code_number'), attrs['id'])
+        if owner != attrs['id']:
+            raise serializers.ValidationError({'code_number': 'client already exists'})
+        return attrs
+
 
 class ClientOrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -228,34 +323,53 @@ class ClientOrderUpdateSerializer(serializers.ModelSerializer):
         ]
 
     def update(self, instance, validated_data):
-        instance.count = validated_data.get('count', instance.count)
-        instance.price = validated_data.get('price', instance.price)
-        instance.received = validated_data.get('received', instance.received)
-        instance.paid = validated_data.get('paid', instance.paid)
-        instance.status = validated_data.get('status', instance.status)
-        instance.the_rest = validated_data.get('count', instance.count) - (validated_data.get('received', instance.received) if validated_data.get('received', instance.received) else 0)
-        instance.payment_type = validated_data.get('payment_type', instance.payment_type)
-        instance.indebtedness = validated_data.get('indebtedness', instance.indebtedness)
-        instance.save()
+        with transaction.atomic():
+            # the balance delta must come from the row as it is now, not as
+            # the view loaded it
+            instance = models.Order.objects.select_for_update().get(pk=instance.pk)
+            previous = balances.order_snapshot(instance)
+            instance.count = validated_data.get('count', instance.count)
+            instance.price = validated_data.get('price', instance.price)
+            instance.received = validated_data.get('received', instance.received)
+            instance.paid = validated_data.get('paid', instance.paid)
+            instance.status = validated_data.get('status', instance.status)
+            instance.the_rest = validated_data.get('count', instance.count) - (validated_data.get('received', instance.received) if validated_data.get('received', instance.received) else 0)
+            instance.payment_type = validated_data.get('payment_type', instance.payment_type)
+            instance.indebtedness = validated_data.get('indebtedness', instance.indebtedness)
+            instance.save()
+            balances.record_order_updated(instance, previous)
         return instance
 
 
 class OrderStatusUpdateSerializer(serializers.Serializer):
     ids = serializers.ListSerializer(child=serializers.IntegerField())
+    lock = serializers.BooleanField(default=False)
 
 
 class NumberOfTripsCreateSerializer(serializers.Serializer):
     client_ids = serializers.ListSerializer(child=serializers.IntegerField())
     number = serializers.CharField()
+    background = serializers.BooleanField(default=False)
+
+    batch_size = 1000
+
+    def validate_client_ids(self, client_ids):
+        client_ids = list(dict.fromkeys(client_ids))
+        found = set(models.Client.objects.filter(id__in=client_ids).values_list('id', flat=True))
+        missing = [client_id for client_id in client_ids if client_id not in found]
+        if missing:
+            raise serializers.ValidationError(f'clients not found: {missing}')
+        return client_ids
 
     def create(self, validated_data):
         with transaction.atomic():
-            for client_id in validated_data['client_ids']:
-                try:
-                    client = models.Client.objects.get(id=client_id)
-                    number_of_trips = models.NumberOfTrips.objects.create(client=client, number=validated_data['number'])
-                except models.Client.DoesNotExist:
-                    raise serializers.ValidationError('client not found')
+            models.NumberOfTrips.objects.bulk_create(
+                [
+                    models.NumberOfTrips(client_id=client_id, number=validated_data['number'])
+                    for client_id in validated_data['client_ids']
+                ],
+                batch_size=self.batch_size,
+            )
             return {"message": "successfully created"}
         
 class ClientOrderListUpdateSerializer(serializers.ModelSerializer):
@@ -266,8 +380,125 @@ class ClientOrderListUpdateSerializer(serializers.ModelSerializer):
         ]
     
     def update(self, instance, validated_data):
-        instance.received = validated_data.get('received', instance.received)
-        instance.the_rest = instance.count - instance.received
-        instance.status = 'delivered'
-        instance.save()
-        return instance
\ No newline at end of file
+        with transaction.atomic():
+            instance = models.Order.objects.select_for_update().get(pk=instance.pk)
+            previous = balances.order_snapshot(instance)
+            instance.received = validated_data.get('received', instance.received)
+            instance.the_rest = instance.count - instance.received
+            instance.status = 'delivered'
+            instance.save()
+            balances.record_order_updated(instance, previous)
+        return instance
+
+
+class OrderOperationSerializer(serializers.Serializer):
+    TYPE = (
+        ('delivery', 'delivery'),
+        ('cancel', 'cancel'),
+        ('payment', 'payment'),
+    )
+
+    key = serializers.CharField(max_length=100)
+    type = serializers.ChoiceField(choices=TYPE)
+    order_id = serializers.IntegerField()
+    received = serializers.IntegerField(min_value=0, required=False)
+    amount = serializers.IntegerField(min_value=0, required=False)
+    payment_type = serializers.ChoiceField(choices=models.Order.PAYMENT_TYPE, required=False)
+
+    def validate(self, attrs):
+        if attrs['type'] == 'delivery' and 'received' not in attrs:
+            raise serializers.ValidationError({'received': 'required for delivery'})
+        if attrs['type'] == 'payment' and 'amount' not in attrs:
+            raise serializers.ValidationError({'amount': 'required for payment'})
+        return attrs
+
+
+class OrderOperationBatchSerializer(serializers.Serializer):
+    operations = OrderOperationSerializer(many=True, allow_empty=False)
+
+
+class ReportQuerySerializer(serializers.Serializer):
+    GROUP_BY = (
+        ('date', 'date'),
+        ('region', 'region'),
+        ('payment_type', 'payment_type'),
+    )
+
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    group_by = serializers.MultipleChoiceField(choices=GROUP_BY, required=False)
+    region = serializers.IntegerField(required=False)
+    payment_type = serializers.ChoiceField(choices=models.Order.PAYMENT_TYPE, required=False)
+
+    def validate(self, attrs):
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from is after date_to')
+        return attrs
+
+
+
+class TruckLoadSerializer(serializers.Serializer):
+    capacity = serializers.IntegerField(min_value=1, max_value=10000)
+    regions = serializers.ListSerializer(child=serializers.IntegerField(), required=False)
+    number = serializers.CharField(required=False)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Job
+        fields = [
+            'id', 'name', 'status', 'attempts', 'max_attempts', 'progress', 'total', 'result', 'error', 'run_at',
+            'created_at', 'finished_at',
+        ]
+
+
+class BalanceRebuildSerializer(serializers.Serializer):
+    client_ids = serializers.ListSerializer(child=serializers.IntegerField(), required=False)
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a flat ModelSerializer: rows come from values()
+    and are turned into the same dicts the serializer would return, without
+    model instances or a field tree per row. Only fields that need formatting
+    (dates, decimals, ...) go through their DRF field.
+    """
+
+    PASSTHROUGH = (
+        serializers.IntegerField, serializers.CharField, serializers.ChoiceField, serializers.BooleanField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.fields = list(serializer_class.Meta.fields)
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)) or field.source != name:
+                raise ValueError(f'{serializer_class.__name__}.{name} is not a plain column')
+            if type(field) not in self.PASSTHROUGH:
+                self.converters.append((name, field.to_representation))
+
+    def rows(self, queryset):
+        return queryset.values(*self.fields)
+
+    def to_representation(self, row):
+        for name, convert in self.converters:
+            if row[name] is not None:
+                row[name] = convert(row[name])
+        return row
+
+    def many(self, rows):
+        with timed_serialization():
+            return [self.to_representation(row) for row in rows]
+
+    def instance(self, instance):
+        with timed_serialization():
+            if instance is None:
+                return self.serializer_class(None).data
+            return self.to_representation({name: getattr(instance, name) for name in self.fields})
+
+
+region_values = ValuesSerializer(RegionListSerializer)
+order_values = ValuesSerializer(OrderListSerializer)
+client_order_values = ValuesSerializer(ClientOrderListSerializer)
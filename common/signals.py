@@ -1,7 +1,8 @@
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-# from common import models 
+from common import balances, caching, middleware, models, sync
 
 
 # @receiver(post_save, sender=models.Order)
@@ -16,4 +17,28 @@ from django.dispatch import receiver
     #     total_paid = models.Order.objects.filter(client=client).aggregate(Sum('paid'))['paid__sum'] or 0
     #     total_price = models.Order.objects.filter(client=client).aggregate(Sum('price'))['price__sum'] or 0
     #     client.debt = total_price - total_paid
-    #     client.save()
\ No newline at end of file
+    #     client.save()
+
+
+@receiver([post_save, post_delete], sender=models.Region)
+def invalidate_regions(sender, **kwargs):
+    caching.invalidate('regions')
+
+
+@receiver(post_delete, sender=models.Client)
+@receiver(post_delete, sender=models.Order)
+@receiver(post_delete, sender=models.ClientPhoneNumber)
+@receiver(post_delete, sender=models.NumberOfTrips)
+def record_deleted(sender, instance, **kwargs):
+    sync.record_deleted(instance)
+
+
+@receiver(post_delete, sender=models.Order)
+def update_balance(sender, instance, **kwargs):
+    # covers the admin and cascades; the API write paths update balances themselves
+    balances.record_order_deleted(instance)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    middleware.install_query_timer(connection)
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from common import models
+
+
+# rows saved in transactions that commit after a sync started can carry an
+# earlier updated_at, so every token overlaps the previous sync a little;
+# apps upsert by id and simply receive those rows twice
+OVERLAP = timedelta(seconds=5)
+
+SECTIONS = [
+    ('clients', models.Client, 'region', [
+        'id', 'code_number', 'full_name', 'region', 'location_text', 'debt', 'cooler', 'price', 'client_type',
+        'created_at', 'updated_at',
+    ]),
+    ('orders', models.Order, 'client__region', [
+        'id', 'client', 'count', 'price', 'the_rest', 'received', 'paid', 'indebtedness', 'status', 'payment_type',
+        'created_at', 'updated_at',
+    ]),
+    ('numbers', models.ClientPhoneNumber, 'client__region', ['id', 'client', 'number', 'created_at', 'updated_at']),
+    ('number_of_trips', models.NumberOfTrips, 'client__region', ['id', 'client', 'number', 'created_at', 'updated_at']),
+]
+
+SYNCED_MODELS = {model: name for name, model, region_lookup, fields in SECTIONS}
+
+
+def parse_token(token):
+    if not token:
+        return None
+    try:
+        since = datetime.fromisoformat(token)
+    except ValueError:
+        return None
+    # tokens are naive local time like the stored timestamps; one sent back
+    # with an offset is converted instead of failing the query
+    if timezone.is_aware(since):
+        since = timezone.make_naive(since)
+    return since
+
+
+def next_token():
+    return (timezone.now() - OVERLAP).isoformat()
+
+
+def iter_sync(since=None, region=None, chunk_size=500):
+    """
+    Yield the JSON body of a sync response piece by piece: a new token, every
+    synced row changed after `since` (all rows when it is None) and the ids
+    deleted after it, so the response never holds more than one chunk.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"token": %s' % encoder.encode(next_token())
+    for name, model, region_lookup, fields in SECTIONS:
+        queryset = model.objects.order_by('updated_at', 'id')
+        if since is not None:
+            queryset = queryset.filter(updated_at__gt=since)
+        if region is not None:
+            queryset = queryset.filter(**{region_lookup: region})
+        yield ', "%s": [' % name
+        separator = ''
+        for row in queryset.values(*fields).iterator(chunk_size=chunk_size):
+            yield separator + encoder.encode(row)
+            separator = ', '
+        yield ']'
+
+    deleted = {name: [] for name, model, region_lookup, fields in SECTIONS}
+    if since is not None:
+        tombstones = models.Tombstone.objects.filter(created_at__gt=since).values_list('model', 'object_id')
+        for name, object_id in tombstones.iterator(chunk_size=chunk_size):
+            deleted[name].append(object_id)
+    yield ', "deleted": %s}' % json.dumps(deleted)
+
+
+def record_deleted(instance):
+    date = instance.created_at.date() if isinstance(instance, models.Order) else None
+    models.Tombstone.objects.create(model=SYNCED_MODELS[type(instance)], object_id=instance.pk, date=date)
@@ -1,2 +1,1417 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
+from asgiref.sync import iscoroutinefunction
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from common import (
+    balances, benchmarks, caching, filters, jobs, loading, metrics, middleware, models, renderers, reports, routers,
+    schema, search, serializers, utils, views,
+)
+
+
+def create_client(region, code_number, orders=1, numbers=1):
+    client = models.Client.objects.create(
+        code_number=code_number,
+        full_name=f'client {code_number}',
+        region=region,
+        location_text='location',
+        cooler='cooler',
+        price=10000,
+        client_type='physical_person',
+    )
+    for i in range(numbers):
+        models.ClientPhoneNumber.objects.create(client=client, number=f'99890{code_number:03}{i:04}')
+    for i in range(orders):
+        models.Order.objects.create(
+            client=client, count=2, price=20000, paid=15000, the_rest=2, indebtedness=5000, payment_type='cash'
+        )
+    balances.rebuild_balances([client.id])
+    search.refresh_documents([client.id])
+    return client
+
+
+class ClientListApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.url = reverse('client list api')
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for code_number in range(2):
+            create_client(self.region, code_number, orders=3, numbers=2)
+        # count, clients, numbers, latest number of trips
+        with self.assertNumQueries(4):
+            self.api.get(self.url)
+
+        for code_number in range(2, 12):
+            client = create_client(self.region, code_number, orders=3, numbers=2)
+            models.NumberOfTrips.objects.create(client=client, number='1')
+        with self.assertNumQueries(4):
+            response = self.api.get(self.url)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_latest_order_and_debt(self):
+        client = create_client(self.region, 1, orders=2)
+        latest = models.Order.objects.create(
+            client=client, count=5, price=50000, paid=0, the_rest=5, indebtedness=50000, payment_type='card'
+        )
+        models.NumberOfTrips.objects.create(client=client, number='7')
+        balances.rebuild_balances([client.id])
+
+        result = self.api.get(self.url).data['results'][0]
+        self.assertEqual(result['order']['id'], latest.id)
+        self.assertEqual(result['all_debt'], 60000)
+        self.assertEqual(result['number_of_trips']['number'], '7')
+        self.assertEqual(len(result['numbers']), 1)
+
+    def test_debt_is_not_inflated_by_order_filters(self):
+        client = create_client(self.region, 1, orders=3)
+        client.orders.update(status='taken')
+
+        result = self.api.get(self.url, {'is_delivered': True}).data['results'][0]
+        self.assertEqual(result['all_debt'], 15000)
+
+
+class ClientDetailApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+
+    def test_detail_query_count(self):
+        client = create_client(self.region, 1, orders=4, numbers=3)
+        url = reverse('client detail api', kwargs={'client_id': client.id})
+        # etag, client, numbers
+        with self.assertNumQueries(3):
+            response = self.api.get(url)
+        self.assertEqual(response.data['orders_count'], 4)
+        self.assertEqual(response.data['empty_dish'], 8)
+        self.assertEqual(response.data['all_debt'], 20000)
+        self.assertEqual(len(response.data['numbers']), 3)
+
+    def test_client_not_found(self):
+        url = reverse('client detail api', kwargs={'client_id': 404})
+        self.assertEqual(self.api.get(url).status_code, 404)
+
+
+class ClientFilterNumberTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.url = reverse('client list api')
+
+    def add_order(self, client, count):
+        return models.Order.objects.create(client=client, count=count, price=count * 10000, payment_type='cash')
+
+    def legacy_selection(self, value):
+        count = 0
+        result = []
+        for client in models.Client.objects.order_by('-created_at').distinct():
+            order = client.orders.filter(count__lte=value).order_by('-created_at').first()
+            if not order:
+                continue
+            if order.count == value or count + order.count <= value:
+                count += order.count
+                result.append(client.pk)
+            if count == value:
+                break
+        return sorted(result)
+
+    def test_matches_greedy_selection(self):
+        counts = [3, 7, 2, 4, 1, 9, 5]
+        for code_number, order_count in enumerate(counts):
+            client = create_client(self.region, code_number, orders=0)
+            self.add_order(client, 20)
+            self.add_order(client, order_count)
+
+        for value in [1, 5, 6, 9, 10, 40]:
+            response = self.api.get(self.url, {'number': value})
+            ids = sorted(row['id'] for row in response.data['results'])
+            self.assertEqual(ids, self.legacy_selection(value), value)
+
+    def test_query_count_does_not_depend_on_client_count(self):
+        for code_number in range(30):
+            client = create_client(self.region, code_number, orders=0)
+            self.add_order(client, 1)
+        # selection, count, clients, numbers, latest number of trips
+        with self.assertNumQueries(5):
+            self.api.get(self.url, {'number': 25})
+
+
+class OrderStatusUpdateApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.url = reverse('order status update api')
+
+    def test_updates_all_orders_in_one_statement(self):
+        client = create_client(self.region, 1, orders=5)
+        ids = list(client.orders.values_list('id', flat=True))
+        # savepoint, select, update orders, update balances, release
+        with self.assertNumQueries(5):
+            response = self.api.post(self.url, {'ids': ids, 'lock': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], ids)
+        self.assertFalse(client.orders.exclude(status='taken').exists())
+
+    def test_reports_missing_orders(self):
+        client = create_client(self.region, 1, orders=2)
+        ids = list(client.orders.values_list('id', flat=True))
+        response = self.api.post(self.url, {'ids': [404] + ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['updated'], ids)
+        self.assertEqual(response.data['missing'], [404])
+        self.assertFalse(client.orders.exclude(status='taken').exists())
+
+        response = self.api.post(self.url, {'ids': [404, 405]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['missing'], [404, 405])
+
+
+class NumberOfTripsCreateApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.url = reverse('number of trips create api')
+
+    def test_constant_query_count(self):
+        ids = [create_client(self.region, code_number, orders=0).id for code_number in range(20)]
+        # lookup, savepoint, insert, release
+        with self.assertNumQueries(4):
+            response = self.api.post(self.url, {'client_ids': ids, 'number': '3'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(models.NumberOfTrips.objects.filter(number='3').count(), 20)
+
+    def test_reports_every_missing_client(self):
+        client = create_client(self.region, 1, orders=0)
+        response = self.api.post(self.url, {'client_ids': [client.id, 404, 405], 'number': '3'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('[404, 405]', str(response.data['client_ids']))
+        self.assertFalse(models.NumberOfTrips.objects.exists())
+
+
+def client_payload(code_number, region, **kwargs):
+    payload = {
+        'code_number': code_number,
+        'full_name': f'client {code_number}',
+        'region': region.id,
+        'location_text': 'location',
+        'cooler': 'cooler',
+        'phone_numbers': ['998901112233', '998907778899'],
+        'capsule_price': 10000,
+        'client_type': 'physical_person',
+        'order_count': 3,
+        'paid': 20000,
+        'payment_type': 'cash',
+    }
+    payload.update(kwargs)
+    return payload
+
+
+class ClientCreateApiViewTest(TestCase):
+    def test_creates_client_numbers_and_order(self):
+        region = models.Region.objects.create(name='Chilonzor')
+        response = APIClient().post(reverse('client create api'), client_payload(1, region), format='json')
+        self.assertEqual(response.status_code, 201)
+        client = models.Client.objects.get(code_number=1)
+        self.assertEqual(client.debt, 10000)
+        self.assertEqual(client.numbers.count(), 2)
+        self.assertEqual(client.orders.get().indebtedness, 10000)
+
+
+class ClientImportTest(TestCase):
+    def setUp(self):
+        self.region = models.Region.objects.create(name='Chilonzor')
+        create_client(self.region, 1)
+
+    def test_import_endpoint_reports_row_errors(self):
+        rows = [
+            client_payload(10, self.region),
+            client_payload(1, self.region),
+            dict(client_payload(11, self.region), region=404),
+            client_payload(10, self.region),
+            client_payload(12, self.region),
+        ]
+        response = APIClient().post(reverse('client import api'), rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        self.assertEqual(models.Order.objects.filter(client__code_number__in=[10, 12]).count(), 2)
+        self.assertEqual(models.ClientPhoneNumber.objects.filter(client__code_number=12).count(), 2)
+
+    def test_queries_per_batch_do_not_depend_on_rows(self):
+        rows = [client_payload(code_number, self.region) for code_number in range(100, 150)]
+        # regions, code numbers, savepoint, clients, numbers, orders, balances, release
+        with self.assertNumQueries(8):
+            results = list(utils.import_clients(rows, batch_size=50))
+        self.assertEqual(results, [(50, [])])
+
+    def test_import_clients_command_reads_csv(self):
+        fields = ['code_number', 'full_name', 'region', 'location_text', 'cooler', 'phone_numbers',
+                  'capsule_price', 'client_type', 'order_count', 'paid', 'payment_type']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for code_number in range(20, 25):
+                row = client_payload(code_number, self.region)
+                row['phone_numbers'] = ';'.join(row['phone_numbers'])
+                writer.writerow(row)
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_clients', f.name, batch_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(models.Client.objects.filter(code_number__gte=20).count(), 5)
+        self.assertEqual(models.ClientPhoneNumber.objects.filter(client__code_number=24).count(), 2)
+
+
+class IndexUsageTest(TestCase):
+    def setUp(self):
+        self.region = models.Region.objects.create(name='Chilonzor')
+        for code_number in range(5):
+            create_client(self.region, code_number, orders=2)
+        if connection.vendor == 'postgresql':
+            # tiny test tables are always cheaper to scan sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_client_orders_by_created_at(self):
+        client = models.Client.objects.first()
+        self.assertUsesIndex(
+            models.Order.objects.filter(client=client).order_by('-created_at'), 'order_client_created_at_idx'
+        )
+
+    def test_orders_by_status(self):
+        self.assertUsesIndex(models.Order.objects.filter(status='taken'), 'order_status_client_idx')
+        self.assertUsesIndex(
+            filters.ClientFilter({'is_new': True}, queryset=models.Client.objects.all()).qs, 'order_status_client_idx'
+        )
+
+    def test_client_list_ordering(self):
+        self.assertUsesIndex(models.Client.objects.order_by('-created_at')[:10], 'client_created_at_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram indexes are PostgreSQL only')
+    def test_search_uses_trigram_indexes(self):
+        self.assertUsesIndex(models.Client.objects.filter(full_name__icontains='lien'), 'client_full_name_trgm_idx')
+        self.assertUsesIndex(
+            models.ClientPhoneNumber.objects.filter(number__icontains='9989'), 'phone_number_trgm_idx'
+        )
+        self.assertUsesIndex(
+            models.NumberOfTrips.objects.filter(number__icontains='1'), 'number_of_trips_number_trgm_idx'
+        )
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+
+    def walk(self, url, params):
+        ids = []
+        response = self.api.get(url, params)
+        while True:
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.api.get(response.data['next'])
+
+    def test_client_list_cursor_pagination(self):
+        clients = [create_client(self.region, code_number) for code_number in range(25)]
+        ids = self.walk(reverse('client list api'), {'pagination': 'cursor'})
+        self.assertEqual(ids, [client.id for client in reversed(clients)])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.api.get(reverse('client list api'), {'pagination': 'cursor'})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_client_list_page_numbers_by_default(self):
+        for code_number in range(12):
+            create_client(self.region, code_number)
+        response = self.api.get(reverse('client list api'), {'page': 2})
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_search_keeps_ranking_in_cursor_mode(self):
+        older = create_client(self.region, 7)
+        models.Client.objects.filter(id=older.id).update(full_name='aziz', created_at=timezone.now() - timedelta(days=1))
+        newer = create_client(self.region, 8)
+        models.Client.objects.filter(id=newer.id).update(full_name='baziz')
+        search.refresh_documents([older.id, newer.id])
+
+        response = self.api.get(reverse('client list api'), {'pagination': 'cursor', 'search': 'aziz'})
+        self.assertEqual([row['id'] for row in response.data['results']], [older.id, newer.id])
+        self.assertEqual(response.data['count'], 2)
+
+    def test_client_order_list_is_paginated(self):
+        client = create_client(self.region, 1, orders=23)
+        url = reverse('client orders list api', kwargs={'client_id': client.id})
+        response = self.api.get(url)
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 10)
+
+        ids = self.walk(url, {'pagination': 'cursor'})
+        self.assertEqual(ids, list(client.orders.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+
+class ClientBalanceTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.api.post(reverse('client create api'), client_payload(1, self.region), format='json')
+        self.client_obj = models.Client.objects.get(code_number=1)
+
+    def assertBalanceMatchesOrders(self):
+        balance = models.ClientBalance.objects.get(client=self.client_obj)
+        expected = (balance.total_debt, balance.empty_bottles, balance.orders_count, balance.last_order_id, balance.last_order_status)
+        balances.rebuild_balances([self.client_obj.id])
+        balance.refresh_from_db()
+        self.assertEqual(
+            expected,
+            (balance.total_debt, balance.empty_bottles, balance.orders_count, balance.last_order_id, balance.last_order_status),
+        )
+        return balance
+
+    def test_balance_follows_order_writes(self):
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual((balance.total_debt, balance.orders_count), (10000, 1))
+
+        response = self.api.post(reverse('client order create api'), {
+            'client_id': self.client_obj.id, 'count': 4, 'paid': 0, 'indebtedness': 40000, 'payment_type': 'cash'
+        }, format='json')
+        order_id = response.data['id']
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual((balance.total_debt, balance.empty_bottles, balance.last_order_id), (50000, 7, order_id))
+
+        self.api.patch(reverse('order received update api', kwargs={'order_id': order_id}), {'received': 3}, format='json')
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual((balance.empty_bottles, balance.last_order_status), (4, 'delivered'))
+
+        self.api.patch(reverse('client order update api', kwargs={'id': order_id}), {'indebtedness': 10000}, format='json')
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual(balance.total_debt, 20000)
+
+        self.api.get(reverse('order status change api', kwargs={'order_id': order_id}))
+        self.assertEqual(self.assertBalanceMatchesOrders().last_order_status, 'cancelled')
+
+        self.api.post(reverse('order status update api'), {'ids': [order_id]}, format='json')
+        self.assertEqual(self.assertBalanceMatchesOrders().last_order_status, 'taken')
+
+    def test_updates_from_a_stale_instance(self):
+        order = self.client_obj.orders.get()
+        # both loaded before either update ran, like two concurrent requests
+        first, second = models.Order.objects.get(id=order.id), models.Order.objects.get(id=order.id)
+        serializer = serializers.ClientOrderUpdateSerializer(first, data={'indebtedness': 30000}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        serializer = serializers.ClientOrderListUpdateSerializer(second, data={'received': 1}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual(balance.total_debt, 30000)
+
+    def test_deleted_orders_update_the_balance(self):
+        first = self.client_obj.orders.get()
+        second = models.Order.objects.create(
+            client=self.client_obj, count=1, price=10000, indebtedness=3000, the_rest=1, payment_type='cash'
+        )
+        balances.record_order_created(second)
+
+        second.delete()
+        balance = self.assertBalanceMatchesOrders()
+        self.assertEqual((balance.total_debt, balance.orders_count, balance.last_order_id), (10000, 1, first.id))
+
+        # the cascade deletes the balance together with the orders
+        self.client_obj.delete()
+        self.assertFalse(models.ClientBalance.objects.exists())
+
+    def test_admin_writes(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:common_client_add'), {
+            'code_number': 2, 'full_name': 'admin client', 'region': self.region.id, 'location_text': 'location',
+            'debt': 0, 'cooler': 'cooler', 'price': 10000, 'client_type': 'physical_person',
+            'numbers-TOTAL_FORMS': 0, 'numbers-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        client = models.Client.objects.get(code_number=2)
+        detail = self.api.get(reverse('client detail api', kwargs={'client_id': client.id})).data
+        self.assertEqual((detail['orders_count'], detail['empty_dish'], detail['all_debt']), (0, 0, 0))
+
+        response = self.client.post(reverse('admin:common_order_add'), {
+            'client': client.id, 'count': 2, 'price': 20000, 'the_rest': 2, 'indebtedness': 5000, 'status': 'new',
+            'payment_type': 'cash',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual((client.balance.total_debt, client.balance.orders_count), (5000, 1))
+
+        order = client.orders.get()
+        response = self.client.post(reverse('admin:common_order_change', args=[order.id]), {
+            'client': self.client_obj.id, 'count': 2, 'price': 20000, 'the_rest': 2, 'indebtedness': 5000,
+            'status': 'new', 'payment_type': 'cash',
+        })
+        self.assertEqual(response.status_code, 302)
+        client.balance.refresh_from_db()
+        self.assertEqual((client.balance.total_debt, client.balance.orders_count), (0, 0))
+        self.assertEqual(self.assertBalanceMatchesOrders().total_debt, 15000)
+
+    def test_detail_without_balance(self):
+        models.ClientBalance.objects.all().delete()
+        detail = self.api.get(reverse('client detail api', kwargs={'client_id': self.client_obj.id})).data
+        self.assertEqual((detail['orders_count'], detail['empty_dish'], detail['all_debt']), (0, 0, 0))
+        result = self.api.get(reverse('client list api')).data['results'][0]
+        self.assertEqual(result['all_debt'], 0)
+
+    def test_rebuild_balances_command(self):
+        models.ClientBalance.objects.all().delete()
+        call_command('rebuild_balances', stdout=io.StringIO())
+        self.assertEqual(self.client_obj.balance.total_debt, 10000)
+
+
+class RegionListCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.url = reverse('region list api')
+        models.Region.objects.create(name='Chilonzor')
+
+    def test_cached_and_conditional(self):
+        response = self.api.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            cached = self.api.get(self.url)
+        self.assertEqual(cached.data, response.data)
+
+        with self.assertNumQueries(0):
+            response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_region_writes_invalidate(self):
+        etag = self.api.get(self.url)['ETag']
+        region = models.Region.objects.create(name='Yunusobod')
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+        etag = response['ETag']
+        region.delete()
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['count'], 1)
+
+
+    def test_last_modified_is_the_version_time(self):
+        with mock.patch('time.time', return_value=1_700_000_000.5):
+            cache.delete('regions:version')
+            response = self.api.get(self.url, {'search': 'x' * 1000})
+            self.assertEqual(response['Last-Modified'], 'Tue, 14 Nov 2023 22:13:20 GMT')
+            response = self.api.get(self.url, HTTP_IF_MODIFIED_SINCE='Tue, 14 Nov 2023 22:13:20 GMT')
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_expires(self):
+        etag = self.api.get(self.url)['ETag']
+        # a worker whose cache never saw a region write moves on once the stamp expires
+        with mock.patch('time.time', return_value=time.time() + caching.VERSION_TIMEOUT + 1):
+            response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1, orders=2)
+
+    def test_client_detail_not_modified(self):
+        url = reverse('client detail api', kwargs={'client_id': self.client_obj.id})
+        etag = self.api.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.api.patch(
+            reverse('client update api', kwargs={'id': self.client_obj.id}), {'full_name': 'renamed'}, format='json'
+        )
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['full_name'], 'renamed')
+
+        number = models.ClientPhoneNumber.objects.create(client=self.client_obj, number='998900000000')
+        models.ClientPhoneNumber.objects.create(client=self.client_obj, number='998900000001')
+        etag = self.api.get(url)['ETag']
+        number.delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_client_orders_not_modified(self):
+        url = reverse('client orders list api', kwargs={'client_id': self.client_obj.id})
+        etag = self.api.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        order = self.client_obj.orders.first()
+        self.api.post(reverse('order status update api'), {'ids': [order.id]}, format='json')
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SyncApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.url = reverse('sync api')
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1, orders=2)
+
+    def sync(self, **params):
+        response = self.api.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_initial_sync_returns_everything(self):
+        data = self.sync()
+        self.assertEqual([row['id'] for row in data['clients']], [self.client_obj.id])
+        self.assertEqual(len(data['orders']), 2)
+        self.assertEqual(len(data['numbers']), 1)
+        self.assertEqual(data['deleted']['orders'], [])
+
+    def test_delta_sync_returns_changes_and_tombstones(self):
+        since = (timezone.now() + timedelta(seconds=1)).isoformat()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=2)):
+            order = self.client_obj.orders.first()
+            order.status = 'delivered'
+            order.save()
+            trip = models.NumberOfTrips.objects.create(client=self.client_obj, number='3')
+            self.api.delete(reverse('number of trips delete api', kwargs={'id': trip.id}))
+            self.client_obj.numbers.all().delete()
+
+        data = self.sync(token=since)
+        self.assertEqual(data['clients'], [])
+        self.assertEqual([row['id'] for row in data['orders']], [order.id])
+        self.assertEqual(data['orders'][0]['status'], 'delivered')
+        self.assertEqual(data['deleted']['number_of_trips'], [trip.id])
+        self.assertEqual(len(data['deleted']['numbers']), 1)
+
+    def test_region_filter_and_invalid_token(self):
+        other = create_client(models.Region.objects.create(name='Yunusobod'), 2)
+        data = self.sync(region=other.region_id)
+        self.assertEqual([row['id'] for row in data['clients']], [other.id])
+        self.assertEqual({row['client'] for row in data['orders']}, {other.id})
+        self.assertEqual(self.api.get(self.url, {'token': 'yesterday'}).status_code, 400)
+
+    def test_token_with_offset(self):
+        since = timezone.now() + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=2)):
+            order = self.client_obj.orders.first()
+            order.save()
+        # the same instant, written in UTC
+        token = timezone.make_aware(since).astimezone(dt_timezone.utc).isoformat()
+        self.assertEqual([row['id'] for row in self.sync(token=token)['orders']], [order.id])
+
+
+class OrderOperationBatchApiViewTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.url = reverse('order operations api')
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1, orders=3)
+        self.orders = list(self.client_obj.orders.order_by('id'))
+
+    def post(self, operations):
+        return self.api.post(self.url, {'operations': operations}, format='json')
+
+    def test_applies_operations_in_one_batch(self):
+        first, second, third = self.orders
+        response = self.post([
+            {'key': 'a', 'type': 'delivery', 'order_id': first.id, 'received': 1},
+            {'key': 'b', 'type': 'cancel', 'order_id': second.id},
+            {'key': 'c', 'type': 'payment', 'order_id': third.id, 'amount': 5000, 'payment_type': 'card'},
+            {'key': 'd', 'type': 'delivery', 'order_id': third.id, 'received': 9},
+            {'key': 'e', 'type': 'cancel', 'order_id': 404},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['success'] for result in response.data['results']], [True, True, True, False, False])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((first.status, first.received, first.the_rest), ('delivered', 1, 1))
+        self.assertEqual(second.status, 'cancelled')
+        self.assertEqual((third.paid, third.indebtedness, third.payment_type), (20000, 0, 'card'))
+        self.assertEqual(models.ClientBalance.objects.get(client=self.client_obj).total_debt, 10000)
+
+    def test_replayed_keys_are_ignored(self):
+        order = self.orders[0]
+        payment = {'key': 'pay-1', 'type': 'payment', 'order_id': order.id, 'amount': 1000}
+        self.post([payment, payment])
+        response = self.post([payment])
+        self.assertTrue(response.data['results'][0]['replayed'])
+        order.refresh_from_db()
+        self.assertEqual(order.paid, 16000)
+
+    def test_query_count_does_not_depend_on_operations(self):
+        operations = [
+            {'key': f'k{order.id}', 'type': 'delivery', 'order_id': order.id, 'received': 2} for order in self.orders
+        ]
+        # savepoint, keys, orders, update, rebuild (savepoint, totals, statuses, upsert, release), insert keys, release
+        with self.assertNumQueries(11):
+            self.post(operations)
+
+
+class ClientSearchTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.url = reverse('client list api')
+        region = models.Region.objects.create(name='Chilonzor')
+        self.api.post(reverse('client create api'), client_payload(
+            501, region, full_name='Olim Karimov', phone_numbers=['+998 (90) 555-12-34']
+        ), format='json')
+        self.api.post(reverse('client create api'), client_payload(
+            77, region, full_name='Karim Oʻrinov', phone_numbers=['998931234567']
+        ), format='json')
+        self.api.post(reverse('client create api'), client_payload(
+            12, region, full_name='Akmal Abdukarimov', phone_numbers=['998977777777']
+        ), format='json')
+
+    def search(self, value):
+        return [row['code_number'] for row in self.api.get(self.url, {'search': value}).data['results']]
+
+    def test_ranked_by_relevance(self):
+        self.assertEqual(self.search('karim'), [77, 501, 12])
+        self.assertEqual(self.search('KARIMOV'), [501, 12])
+        self.assertEqual(self.search("o'rinov"), [77])
+
+    def test_code_number_and_phone_digits(self):
+        self.assertEqual(self.search('77'), [77, 12])
+        self.assertEqual(self.search('90 555 12 34'), [501])
+
+    def test_phone_punctuation_only(self):
+        self.assertEqual(self.search('+-'), [])
+        self.assertEqual(self.search('()'), [])
+
+    def test_document_follows_client_updates(self):
+        client = models.Client.objects.get(code_number=12)
+        self.api.patch(
+            reverse('client update api', kwargs={'id': client.id}),
+            {'full_name': 'Akmal Toshev', 'numbers': [{'number': '998901010101'}]},
+            format='json',
+        )
+        self.assertEqual(self.search('toshev'), [12])
+        self.assertEqual(self.search('998901010101'), [12])
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.clients = [create_client(self.region, code_number, orders=12, numbers=2) for code_number in range(12)]
+
+    def assertSameAsSync(self, name, params=None, **kwargs):
+        sync_response = self.api.get(reverse(name, kwargs=kwargs), params)
+        async_response = self.client.get(reverse(f'async {name}', kwargs=kwargs), params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(
+            json.loads(async_response.content)['results'],
+            json.loads(json.dumps(sync_response.data['results'])),
+        )
+        return json.loads(async_response.content)
+
+    def test_lists_match_sync_views(self):
+        data = self.assertSameAsSync('client list api', {'page': 2})
+        self.assertEqual(data['count'], 12)
+        self.assertIsNotNone(data['previous'])
+        self.assertSameAsSync('client list api', {'search': 'client 1'})
+        self.assertSameAsSync('client orders list api', client_id=self.clients[0].id)
+        self.assertSameAsSync('region list api')
+
+    def test_client_detail(self):
+        client = self.clients[0]
+        response = self.client.get(reverse('async client detail api', kwargs={'client_id': client.id}))
+        self.assertEqual(
+            json.loads(response.content),
+            self.api.get(reverse('client detail api', kwargs={'client_id': client.id})).data,
+        )
+        self.assertEqual(self.client.get(reverse('async client detail api', kwargs={'client_id': 404})).status_code, 404)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.clients = [create_client(self.region, code_number, orders=2, numbers=2) for code_number in range(3)]
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_client_export(self):
+        rows = self.read(self.api.get(reverse('client export api'), {'search': 'client 1'}))
+        self.assertEqual(len(rows), 1)
+        client = self.clients[1]
+        self.assertEqual(rows[0]['code_number'], str(client.code_number))
+        self.assertEqual(rows[0]['all_debt'], '10000')
+        self.assertEqual(rows[0]['last_order_id'], str(client.orders.order_by('id').last().id))
+        self.assertEqual(len(rows[0]['phone_numbers'].split(', ')), 2)
+
+    def test_client_export_query_count(self):
+        # clients, numbers
+        with self.assertNumQueries(2):
+            self.read(self.api.get(reverse('client export api')))
+
+    def test_order_export_date_range(self):
+        old = self.clients[0].orders.first()
+        models.Order.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=40))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        rows = self.read(self.api.get(reverse('order export api'), {'date_from': since}))
+        self.assertEqual(len(rows), 5)
+        self.assertNotIn(str(old.id), [row['id'] for row in rows])
+
+    def test_export_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            pass
+        self.addCleanup(os.remove, f.name)
+        call_command('export', 'orders', '--filter', f'region={self.region.id}', output=f.name)
+        with open(f.name, encoding='utf-8-sig') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 6)
+
+
+class ReportTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.url = reverse('reports api')
+        self.chilonzor = models.Region.objects.create(name='Chilonzor')
+        self.yunusobod = models.Region.objects.create(name='Yunusobod')
+        self.today = timezone.now().date()
+        create_client(self.chilonzor, 1, orders=3)
+        create_client(self.yunusobod, 2, orders=1)
+        models.Order.objects.filter(client__code_number=1).update(status='delivered')
+        models.Order.objects.filter(client__code_number=2).update(status='cancelled')
+
+    def get(self, **params):
+        params.setdefault('date_from', self.today)
+        params.setdefault('date_to', self.today)
+        response = self.api.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_report_from_rollups(self):
+        call_command('rollup_orders', stdout=io.StringIO())
+        total = self.get()[0]
+        self.assertEqual(total['orders_count'], 4)
+        self.assertEqual(total['bottles_delivered'], 6)
+        self.assertEqual(total['revenue'], 45000)
+        self.assertEqual(total['new_debt'], 15000)
+        self.assertEqual(total['cancellation_rate'], 0.25)
+
+        by_region = self.get(group_by=['region', 'date'])
+        self.assertEqual([row['region'] for row in by_region], [self.chilonzor.id, self.yunusobod.id])
+        self.assertEqual(by_region[1]['cancellation_rate'], 1)
+        with self.assertNumQueries(1):
+            self.get(group_by='payment_type')
+
+    def test_incremental_rollup_only_touches_changed_days(self):
+        old = models.Order.objects.filter(client__code_number=1).first()
+        old_day = self.today - timedelta(days=10)
+        models.Order.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=10))
+        call_command('rollup_orders', stdout=io.StringIO())
+        self.assertEqual(models.DailyOrderRollup.objects.filter(date=old_day).count(), 1)
+        # skip the overlap window so that only the update below counts as new
+        models.RollupWatermark.objects.update(watermark=timezone.now())
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=1)):
+            order = models.Order.objects.get(id=old.id)
+            order.status = 'cancelled'
+            order.save()
+        self.assertEqual(reports.rollup_orders(), 1)
+        self.assertEqual(self.get(date_from=old_day, date_to=old_day)[0]['cancelled_count'], 1)
+
+    def test_incremental_rollup_sees_deletes(self):
+        call_command('rollup_orders', stdout=io.StringIO())
+        # skip the overlap window so that only the deletes below count as new
+        models.RollupWatermark.objects.update(watermark=timezone.now())
+        models.Order.objects.filter(client__code_number=1).first().delete()
+        self.assertEqual(self.get()[0]['orders_count'], 4)
+        reports.rollup_orders()
+        self.assertEqual(self.get()[0]['orders_count'], 3)
+
+        models.RollupWatermark.objects.update(watermark=timezone.now())
+        models.Client.objects.filter(code_number=2).delete()
+        reports.rollup_orders()
+        self.assertEqual(self.get()[0]['cancelled_count'], 0)
+
+    def test_invalid_range(self):
+        response = self.api.get(self.url, {'date_from': self.today, 'date_to': self.today - timedelta(days=1)})
+        self.assertEqual(response.status_code, 400)
+
+
+class TruckLoadTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.url = reverse('truck load api')
+        self.chilonzor = models.Region.objects.create(name='Chilonzor')
+        self.yunusobod = models.Region.objects.create(name='Yunusobod')
+
+    def order(self, region, code_number, count, status='new'):
+        client = create_client(region, code_number, orders=0)
+        return models.Order.objects.create(client=client, count=count, price=20000, status=status)
+
+    def test_plan_load_fills_exactly(self):
+        # greedy by age would take 6 + 3 and stop at 9
+        orders = [(1, 6, 1), (2, 3, 1), (3, 5, 1), (4, 5, 1)]
+        self.assertEqual([order[0] for order in loading.plan_load(orders, 10)], [3, 4])
+        self.assertEqual(loading.plan_load(orders, 2), [])
+
+    def test_plan_load_prefers_single_region(self):
+        orders = [(1, 4, 1), (2, 6, 2), (3, 4, 2), (4, 2, 1)]
+        self.assertEqual([order[0] for order in loading.plan_load(orders, 10)], [2, 3])
+
+    def test_plan_load_10k_orders(self):
+        rng = random.Random(0)
+        orders = [(i, rng.randint(1, 40), rng.randint(1, 12)) for i in range(10000)]
+        # the DP runs over distinct bottle counts, not over orders; its
+        # latency is covered by the truck load api budget in common.benchmarks
+        with mock.patch('common.loading.best_fill', wraps=loading.best_fill) as best_fill:
+            selected = loading.plan_load(orders, 1000)
+        self.assertEqual(sum(order[1] for order in selected), 1000)
+        self.assertEqual(len({order[0] for order in selected}), len(selected))
+        self.assertLessEqual(best_fill.call_count, 1 + 12)
+        self.assertEqual(sum(best_fill.call_args_list[0].args[0].values()), 10000)
+        for (counts, capacity), kwargs in best_fill.call_args_list:
+            self.assertLessEqual(len(counts), 40)
+
+    def test_load_and_assign(self):
+        first = self.order(self.chilonzor, 1, 6)
+        second = self.order(self.chilonzor, 2, 4)
+        self.order(self.chilonzor, 3, 4, status='delivered')
+        other = self.order(self.yunusobod, 4, 4)
+
+        response = self.api.post(self.url, {'capacity': 10, 'number': '7'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['bottles'], 10)
+        self.assertEqual(response.data['order_ids'], [first.id, second.id])
+        self.assertEqual(response.data['regions'], [
+            {'region': self.chilonzor.id, 'order_ids': [first.id, second.id], 'bottles': 10}
+        ])
+        self.assertEqual(
+            set(models.NumberOfTrips.objects.filter(number='7').values_list('client', flat=True)),
+            {first.client_id, second.client_id},
+        )
+
+        response = self.api.post(self.url, {'capacity': 10, 'regions': [self.yunusobod.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_ids'], [other.id])
+        self.assertEqual(models.NumberOfTrips.objects.count(), 2)
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1)
+        metrics.reset()
+
+    def test_server_timing_and_metrics(self):
+        response = self.api.get(reverse('client detail api', args=[self.client_obj.id]))
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(
+            timing, r'db;dur=[\d.]+;desc="3 queries", serialize;dur=[\d.]+, encode;dur=[\d.]+, total;dur=[\d.]+',
+        )
+
+        response = self.api.get(reverse('metrics'))
+        self.assertNotIn('Server-Timing', response)
+        body = response.content.decode()
+        labels = 'view="client detail api",method="GET"'
+        self.assertIn('http_requests_total{view="client detail api",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_queries_bucket{%s,le="5"} 1' % labels, body)
+        self.assertIn('http_request_queries_bucket{%s,le="2"} 0' % labels, body)
+        self.assertIn('http_request_duration_seconds_count{%s} 1' % labels, body)
+        self.assertIn('http_request_serialize_duration_seconds_count{%s} 1' % labels, body)
+
+    def test_serializers_are_timed_once(self):
+        # loaded up front so no query inside the serializers reads the clock
+        client = views.ClientDetailApiView.queryset.get(id=self.client_obj.id)
+        rows = list(models.Region.objects.values('id', 'name'))
+        timer = middleware.RequestTimer()
+        token = middleware.current_timer.set(timer)
+        try:
+            with mock.patch('common.middleware.time.perf_counter', side_effect=[1.0, 1.25]):
+                data = serializers.ClientDetailSerializer(client).data
+            self.assertEqual(data['id'], self.client_obj.id)
+            self.assertEqual(timer.serialize, 0.25)
+
+            with mock.patch('common.middleware.time.perf_counter', side_effect=[2.0, 2.5]):
+                serializers.region_values.many(rows)
+            self.assertEqual(timer.serialize, 0.75)
+            self.assertFalse(timer.serializing)
+        finally:
+            middleware.current_timer.reset(token)
+
+    async def test_async_views_keep_the_async_chain(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+        url = reverse('async client detail api', args=[self.client_obj.id])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    def test_slow_requests_are_logged(self):
+        with self.settings(SLOW_REQUEST_MS=0), self.assertLogs('common.requests', 'WARNING') as logs:
+            self.api.get(reverse('region list api'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'slow_request')
+        self.assertEqual(record['view'], 'region list api')
+        self.assertEqual(record['status'], 200)
+        self.assertIn('serialize_ms', record)
+
+
+class EndpointBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_perf_data', clients=40, orders=400, days=30, batch_size=100, stdout=io.StringIO())
+
+    def test_seed_perf_data(self):
+        self.assertEqual(models.Client.objects.count(), 40)
+        self.assertEqual(models.Order.objects.count(), 400)
+        self.assertEqual(models.ClientBalance.objects.count(), 40)
+        self.assertTrue(models.DailyOrderRollup.objects.exists())
+        self.assertEqual(models.Order.objects.dates('created_at', 'day').count(), 30)
+
+    def test_query_budgets_are_exact(self):
+        budget = dict(benchmarks.BUDGETS['region list api'], ms=10_000)
+        for queries, ok in [(budget['queries'], True), (budget['queries'] + 1, False)]:
+            with mock.patch.dict(benchmarks.BUDGETS, {'region list api': dict(budget, queries=queries)}):
+                [result] = benchmarks.run(['region list api'], repeat=1)
+            self.assertEqual(result['ok'], ok)
+
+    def test_every_endpoint_has_a_budget(self):
+        from common import urls
+
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(benchmarks.BUDGETS))
+        self.assertEqual(names, set(benchmarks.endpoint_requests()))
+
+    def test_endpoints_within_budget(self):
+        api = APIClient()
+        for name, (method, path, data) in benchmarks.endpoint_requests().items():
+            budget = benchmarks.BUDGETS[name]
+            with self.subTest(name):
+                caching.invalidate('regions')
+                with transaction.atomic():
+                    path = benchmarks.prepare(path)
+                    with self.assertNumQueries(budget['queries']):
+                        response, elapsed = benchmarks.send(api, method, path, data)
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 400)
+                self.assertLessEqual(elapsed, budget['ms'])
+
+    def test_benchmark_endpoints_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_endpoints', 'region list api', repeat=1, output=output, stdout=io.StringIO())
+            call_command(
+                'benchmark_endpoints', 'region list api', repeat=1, output=output, compare=output, stdout=io.StringIO()
+            )
+            with open(output) as f:
+                results = json.load(f)['results']
+        self.assertEqual([result['name'] for result in results], ['region list api'])
+        self.assertTrue(results[0]['ok'])
+
+
+class ClientUpdateTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1, numbers=2)
+        self.other = create_client(self.region, 2)
+        self.numbers = dict(self.client_obj.numbers.values_list('number', 'id'))
+
+    def patch(self, data):
+        return self.api.patch(reverse('client update api', kwargs={'id': self.client_obj.id}), data, format='json')
+
+    def test_numbers_are_diffed(self):
+        kept, removed = sorted(self.numbers)
+        response = self.patch({'numbers': [{'number': kept}, {'number': '998909999999'}]})
+        self.assertEqual(response.status_code, 200, response.data)
+        numbers = dict(self.client_obj.numbers.values_list('number', 'id'))
+        self.assertEqual(set(numbers), {kept, '998909999999'})
+        self.assertEqual(numbers[kept], self.numbers[kept])
+        self.client_obj.refresh_from_db()
+        self.assertIn('998909999999', self.client_obj.search_document)
+        self.assertNotIn(removed, self.client_obj.search_document)
+
+    def test_duplicated_numbers(self):
+        kept, removed = sorted(self.numbers)
+        models.ClientPhoneNumber.objects.bulk_create([
+            models.ClientPhoneNumber(client=self.client_obj, number=kept),
+            models.ClientPhoneNumber(client=self.client_obj, number=removed),
+        ])
+        response = self.patch({'numbers': [{'number': kept}]})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(list(self.client_obj.numbers.values_list('number', 'id')), [(kept, self.numbers[kept])])
+
+    def test_missing_numbers_are_kept(self):
+        # client, numbers, savepoint, update, release
+        with self.assertNumQueries(5):
+            response = self.patch({'full_name': 'renamed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(self.client_obj.numbers.values_list('number', 'id')), self.numbers)
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.full_name, 'renamed')
+        self.assertTrue(self.client_obj.search_document.startswith('renamed 1 '))
+
+    def test_unchanged_payload_writes_nothing(self):
+        updated_at = self.client_obj.updated_at
+        # client, numbers, savepoint, release
+        with self.assertNumQueries(4):
+            self.patch({'full_name': self.client_obj.full_name, 'numbers': [{'number': n} for n in self.numbers]})
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.updated_at, updated_at)
+
+    def test_bulk_update(self):
+        response = self.api.patch(reverse('client bulk update api'), [
+            {'id': self.client_obj.id, 'full_name': 'first', 'numbers': [{'number': '998901111111'}]},
+            {'id': self.other.id, 'price': 12000, 'region': self.region.id},
+        ], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['updated'], 2)
+        self.client_obj.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.client_obj.full_name, 'first')
+        self.assertEqual(list(self.client_obj.numbers.values_list('number', flat=True)), ['998901111111'])
+        self.assertEqual(self.other.price, 12000)
+        self.assertEqual(self.other.numbers.count(), 1)
+
+    def test_bulk_update_is_all_or_nothing(self):
+        response = self.api.patch(reverse('client bulk update api'), [
+            {'id': self.client_obj.id, 'full_name': 'first'},
+            {'id': self.other.id, 'code_number': 1},
+            {'id': 404, 'full_name': 'missing'},
+            {'id': self.client_obj.id, 'region': 404},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.full_name, 'client 1')
+
+
+class JobsTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.clients = [create_client(self.region, code_number) for code_number in range(3)]
+
+    def test_trips_in_background(self):
+        response = self.api.post(reverse('number of trips create api'), {
+            'client_ids': [client.id for client in self.clients], 'number': '5', 'background': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(response['Location'], response.data['url'])
+        self.assertFalse(models.NumberOfTrips.objects.exists())
+
+        call_command('run_workers', once=True, stdout=io.StringIO())
+        job = self.api.get(response['Location']).data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual((job['progress'], job['total']), (3, 3))
+        self.assertEqual(job['result'], {'created': 3})
+        self.assertEqual(models.NumberOfTrips.objects.filter(number='5').count(), 3)
+
+    def test_export_in_background(self):
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            response = self.api.get(reverse('client export api'), {'background': 1, 'region': self.region.id})
+            self.assertEqual(response.status_code, 202)
+            jobs.work(once=True)
+            job = models.Job.objects.get(id=response.data['id'])
+            self.assertEqual(job.status, 'succeeded', job.error)
+            self.assertEqual(job.result['rows'], 3)
+            with open(os.path.join(media, 'exports', f'clients-{job.id}.csv'), encoding='utf-8') as f:
+                self.assertEqual(len(list(csv.reader(f))), 4)
+
+    def test_retries_with_backoff(self):
+        failing = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict(jobs.TASKS, {'boom': failing}), self.assertLogs('common.jobs', 'ERROR'):
+            job = jobs.enqueue('boom', {'value': 1})
+            jobs.work(once=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            self.assertIn('RuntimeError: boom', job.error)
+            delay = job.run_at - timezone.now()
+            self.assertTrue(timedelta(seconds=9) < delay <= jobs.BACKOFF)
+
+            # not due yet
+            self.assertEqual(jobs.work(once=True), 0)
+            for attempt in (2, 3):
+                models.Job.objects.filter(id=job.id).update(run_at=timezone.now())
+                jobs.work(once=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 3))
+            self.assertIsNotNone(job.finished_at)
+        self.assertEqual(failing.call_count, 3)
+        failing.assert_called_with(mock.ANY, value=1)
+
+    def test_stale_jobs_are_requeued(self):
+        job = jobs.enqueue('rebuild_balances')
+        models.Job.objects.filter(id=job.id).update(
+            status='running', locked_by='dead', locked_at=timezone.now() - jobs.STALE_AFTER - timedelta(minutes=1)
+        )
+        self.assertEqual(jobs.work(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, {'rebuilt': 3})
+
+    def test_failed_attempt_keeps_progress(self):
+        def half_done(progress):
+            progress(5, 10)
+            raise RuntimeError('boom')
+
+        with mock.patch.dict(jobs.TASKS, {'half': half_done}), self.assertLogs('common.jobs', 'ERROR'):
+            jobs.enqueue('half')
+            job = jobs.run(jobs.claim('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.total), ('queued', 5, 10))
+
+    def test_heartbeat_keeps_running_jobs_claimed(self):
+        jobs.enqueue('rebuild_balances')
+        job = jobs.claim('worker')
+        models.Job.objects.filter(id=job.id).update(locked_at=timezone.now() - jobs.STALE_AFTER - timedelta(minutes=1))
+        stop = mock.Mock()
+        stop.wait.side_effect = [False, True]
+        jobs.heartbeat(job, stop)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'worker'))
+
+    def test_job_list_and_missing_job(self):
+        self.api.post(reverse('balance rebuild api'), {}, format='json')
+        self.assertEqual(self.api.get(reverse('job list api'), {'status': 'queued'}).data['count'], 1)
+        self.assertEqual(self.api.get(reverse('job detail api', kwargs={'job_id': 404})).status_code, 404)
+
+
+class FastSerializationTest(TestCase):
+    def setUp(self):
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1, orders=3)
+        self.client_obj.orders.filter(id=self.client_obj.orders.first().id).update(received=2, paid=None)
+
+    def test_values_match_serializers(self):
+        orders = models.Order.objects.order_by('id')
+        for values, serializer_class, queryset in [
+            (serializers.order_values, serializers.OrderListSerializer, orders),
+            (serializers.client_order_values, serializers.ClientOrderListSerializer, orders),
+            (serializers.region_values, serializers.RegionListSerializer, models.Region.objects.order_by('id')),
+        ]:
+            self.assertEqual(values.many(values.rows(queryset)), serializer_class(queryset, many=True).data)
+
+        order = orders.first()
+        self.assertEqual(serializers.order_values.instance(order), serializers.OrderListSerializer(order).data)
+        self.assertEqual(serializers.order_values.instance(None), serializers.OrderListSerializer(None).data)
+
+    def test_nested_serializers_are_rejected(self):
+        with self.assertRaises(ValueError):
+            serializers.ValuesSerializer(serializers.ClientListSerializer)
+
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'orders': serializers.ClientOrderListSerializer(models.Order.objects.all(), many=True).data,
+            'created_at': timezone.now(),
+            'text': 'Toshkent \u2028 ўзбек',
+            1: None,
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_orjson_parser(self):
+        parser = renderers.ORJSONParser()
+        data = parser.parse(io.BytesIO('{"name": "ўзбек", "ids": [1, 2]}'.encode()))
+        self.assertEqual(data, {'name': 'ўзбек', 'ids': [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"name":'))
+
+    def test_client_orders_list(self):
+        url = reverse('client orders list api', kwargs={'client_id': self.client_obj.id})
+        response = APIClient().get(url)
+        orders = self.client_obj.orders.order_by('-created_at', '-id')
+        expected = JSONRenderer().render(serializers.ClientOrderListSerializer(orders, many=True).data)
+        self.assertEqual(response.json()['results'], json.loads(expected))
+
+
+class SchemaTest(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user('admin', is_staff=True))
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(OPENAPI_SCHEMA_ROOT=root.name))
+        self.enterContext(mock.patch.dict(schema.documents, clear=True))
+
+    def test_generate_schema_command(self):
+        call_command('generate_schema', stdout=io.StringIO())
+        with open(schema.schema_path('json'), 'rb') as f:
+            document = json.loads(f.read())
+        self.assertIn('/client/list/', document['paths'])
+        self.assertTrue(os.path.exists(schema.schema_path('yaml')))
+
+    def test_schema_is_generated_once(self):
+        generate = mock.Mock(wraps=schema.generate)
+        with mock.patch.object(schema, 'generate', generate):
+            first = self.api.get('/swagger.json')
+            schema.documents.clear()
+            second = self.api.get('/swagger.json')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('paths', json.loads(first.content))
+
+        response = self.api.get('/swagger.json', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(self.api.get('/swagger.yaml')['Content-Type'].startswith('application/yaml'))
+
+    def test_version_follows_source_changes(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.py') as source:
+            versions = []
+            for content in ['a = 1', 'a = 2']:
+                source.seek(0)
+                source.write(content)
+                source.flush()
+                schema.schema_version.cache_clear()
+                with mock.patch.object(schema, 'source_files', return_value=[source.name]):
+                    versions.append(schema.schema_version())
+        schema.schema_version.cache_clear()
+        self.assertNotEqual(versions[0], versions[1])
+
+    def test_swagger_ui(self):
+        with mock.patch.object(schema, 'generate') as generate:
+            response = self.api.get('/swagger/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        generate.assert_not_called()
+
+
+class JobProgressTest(TransactionTestCase):
+    def setUp(self):
+        region = models.Region.objects.create(name='Chilonzor')
+        self.client_ids = [create_client(region, code_number, orders=0).id for code_number in range(5)]
+
+    def read_progress(self, job_id):
+        # from another thread, and so from another database connection
+        seen = []
+
+        def read():
+            try:
+                seen.append(models.Job.objects.values_list('progress', flat=True).get(id=job_id))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        return seen[0]
+
+    def test_trip_progress_is_visible_while_running(self):
+        job = jobs.enqueue('assign_trips', {'client_ids': self.client_ids, 'number': '4', 'batch_size': 2})
+        seen = []
+        bulk_create = models.NumberOfTrips.objects.bulk_create
+
+        def create_batch(objs):
+            seen.append(self.read_progress(job.id))
+            return bulk_create(objs)
+
+        with mock.patch.object(models.NumberOfTrips.objects, 'bulk_create', create_batch):
+            jobs.work(once=True)
+        self.assertEqual(seen, [0, 2, 4])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('succeeded', 5))
+
+    def test_retry_resumes_after_committed_batches(self):
+        job = jobs.enqueue('assign_trips', {'client_ids': self.client_ids, 'number': '4', 'batch_size': 2})
+        models.Job.objects.filter(id=job.id).update(progress=4)
+        jobs.work(once=True)
+        self.assertEqual(
+            list(models.NumberOfTrips.objects.values_list('client', flat=True)), self.client_ids[4:]
+        )
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias, see core/test_settings.py')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    # not a TestCase: its wrapping transaction keeps every read on the primary
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.region = models.Region.objects.create(name='Chilonzor')
+        self.client_obj = create_client(self.region, 1)
+        # the "replica" lags behind and only has a different client
+        region = models.Region.objects.using('replica').create(id=self.region.id, name='Chilonzor')
+        models.Client.objects.using('replica').create(
+            code_number=2, full_name='replica client', region=region, location_text='location', cooler='cooler',
+            price=10000, client_type='physical_person',
+        )
+
+    def names(self):
+        return [client['full_name'] for client in self.api.get(reverse('client list api')).data['results']]
+
+    def test_opted_in_reads_use_the_replica(self):
+        self.assertEqual(self.names(), ['replica client'])
+        # not opted in
+        response = self.api.get(reverse('client detail api', kwargs={'client_id': self.client_obj.id}))
+        self.assertEqual(response.data['full_name'], 'client 1')
+
+    def test_reads_after_a_write_stick_to_the_primary(self):
+        response = self.api.patch(
+            reverse('client update api', kwargs={'id': self.client_obj.id}), {'full_name': 'renamed'}, format='json'
+        )
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(self.names(), ['renamed'])
+
+        self.api.cookies.clear()
+        self.assertEqual(self.names(), ['replica client'])
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(models.Client), 'default')
+        with routers.use_replica():
+            self.assertEqual(router.db_for_read(models.Client), 'replica')
+            self.assertEqual(router.db_for_write(models.Client), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(models.Client), 'default')
+            with self.settings(DATABASE_REPLICAS=[]):
+                self.assertEqual(router.db_for_read(models.Client), 'default')
+
+    def test_one_replica_per_request(self):
+        router = routers.ReplicaRouter()
+        with self.settings(DATABASE_REPLICAS=['replica', 'default']), mock.patch('random.choice') as choice:
+            choice.return_value = 'replica'
+            with routers.use_replica():
+                aliases = {router.db_for_read(models.Client) for _ in range(5)}
+        self.assertEqual(aliases, {'replica'})
+        choice.assert_called_once_with(['replica', 'default'])
+
+    def test_middleware_is_not_adapted_under_asgi(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        # Django logs every sync middleware it has to adapt when DEBUG is on
+        with self.settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
@@ -1,23 +1,43 @@
 from django.urls import path 
 
-from common import views 
+from common import async_views, views 
 
 
 urlpatterns = [
     path('client/create/', views.ClientCreateApiView.as_view(), name='client create api'),
+    path('client/import/', views.ClientImportApiView.as_view(), name='client import api'),
     path('client/order/create/', views.ClientOrderCreateApiView.as_view(), name='client order create api'),
     path('client/<int:client_id>/order/list/', views.ClientOrderListApiView.as_view(), name='client orders list api'),
     path('client/<int:client_id>/', views.ClientDetailApiView.as_view(), name='client detail api'),
     path('client/list/', views.ClientListApiView.as_view(), name='client list api'),
     path('client/<int:id>/update/', views.ClientUpdateApiView.as_view(), name='client update api'),
+    path('client/bulk/update/', views.ClientBulkUpdateApiView.as_view(), name='client bulk update api'),
     path('client/order/<int:id>/update/', views.ClientOrderUpdateApiView.as_view(), name='client order update api'),
     
     path('order/status/update/', views.OrderStatusUpdateApiView.as_view(), name='order status update api'),
     path('order/<int:order_id>/change/status/', views.OrderStatusChangeApiView.as_view(), name='order status change api'),
     path("order/<int:order_id>/received/update/", views.ClientOrderListUpdateApiView.as_view(), name="order received update api"),
+    path('order/operations/', views.OrderOperationBatchApiView.as_view(), name='order operations api'),
     
     path('number_of_trips/create/', views.NumberOfTripsCreateApiView.as_view(), name='number of trips create api'),
     path("number_of_trips/<int:id>/delete/", views.NumberOfTripsDeleteApiView.as_view(), name="number of trips delete api"),
+    path('number_of_trips/load/', views.TruckLoadApiView.as_view(), name='truck load api'),
     
     path('region/list/', views.RegionListApiView.as_view(), name='region list api'),
+
+    path('sync/', views.SyncApiView.as_view(), name='sync api'),
+
+    path('export/clients/', views.ClientExportApiView.as_view(), name='client export api'),
+    path('export/orders/', views.OrderExportApiView.as_view(), name='order export api'),
+
+    path('reports/', views.ReportApiView.as_view(), name='reports api'),
+
+    path('balances/rebuild/', views.BalanceRebuildApiView.as_view(), name='balance rebuild api'),
+    path('jobs/', views.JobListApiView.as_view(), name='job list api'),
+    path('jobs/<int:job_id>/', views.JobDetailApiView.as_view(), name='job detail api'),
+
+    path('async/client/list/', async_views.AsyncClientListView.as_view(), name='async client list api'),
+    path('async/client/<int:client_id>/', async_views.AsyncClientDetailView.as_view(), name='async client detail api'),
+    path('async/client/<int:client_id>/order/list/', async_views.AsyncClientOrderListView.as_view(), name='async client orders list api'),
+    path('async/region/list/', async_views.AsyncRegionListView.as_view(), name='async region list api'),
 ]
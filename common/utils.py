@@ -1,13 +1,101 @@
-from common import models 
+from itertools import islice
 
+from django.db import transaction
 
-def add_debt_client(debt, client):
-    client.debt += debt
-    client.save()
-    return client.debt
+from common import balances, models, serializers
 
-def subtract_debt_client(debt, client):
-    client.debt -= debt
-    client.save()
-    return client.debt
 
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def import_clients(rows, batch_size=1000):
+    """
+    Create clients, their phone numbers and first orders from an iterable of
+    ClientCreateSerializer payloads. Rows are consumed lazily, batch_size at a
+    time; for every batch yields (created_count, [(row_number, errors), ...]).
+    """
+    rows = iter(rows)
+    row_number = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        region_ids = {_to_int(row.get('region')) for row in batch if isinstance(row, dict)}
+        code_numbers = {_to_int(row.get('code_number')) for row in batch if isinstance(row, dict)}
+        context = {
+            'regions': models.Region.objects.in_bulk(region_ids - {None}),
+            'code_numbers': set(
+                models.Client.objects.filter(code_number__in=code_numbers - {None}).values_list('code_number', flat=True)
+            ),
+        }
+
+        valid = []
+        errors = []
+        for row in batch:
+            row_number += 1
+            serializer = serializers.ClientImportSerializer(data=row, context=context)
+            if serializer.is_valid():
+                context['code_numbers'].add(serializer.validated_data['code_number'])
+                valid.append(serializer.validated_data)
+            else:
+                errors.append((row_number, serializer.errors))
+
+        with transaction.atomic():
+            clients = models.Client.objects.bulk_create(
+                [serializers.ClientImportSerializer.build_client(data) for data in valid]
+            )
+            numbers = []
+            orders = []
+            for client, data in zip(clients, valid):
+                numbers.extend(serializers.ClientImportSerializer.build_numbers(client, data))
+                orders.append(serializers.ClientImportSerializer.build_order(client, data))
+            models.ClientPhoneNumber.objects.bulk_create(numbers)
+            models.Order.objects.bulk_create(orders)
+            models.ClientBalance.objects.bulk_create(
+                [balances.build_balance(order.client, order) for order in orders]
+            )
+
+        yield len(clients), errors
+
+
+def update_clients(rows):
+    """
+    Validate a list of ClientBulkUpdateSerializer payloads and, when every row
+    is valid, apply them together. Returns (updated_count, [(row_number, errors), ...]);
+    nothing is written when there are errors.
+    """
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    client_ids = [_to_int(row.get('id')) for row in rows]
+    code_numbers = {_to_int(row.get('code_number')) for row in rows}
+    context = {
+        'clients': models.Client.objects.in_bulk(set(client_ids) - {None}),
+        'regions': models.Region.objects.in_bulk({_to_int(row.get('region')) for row in rows} - {None}),
+        'code_numbers': dict(
+            models.Client.objects.filter(code_number__in=code_numbers - {None}).values_list('code_number', 'id')
+        ),
+    }
+
+    changes = {}
+    errors = []
+    for row_number, row in enumerate(rows, start=1):
+        serializer = serializers.ClientBulkUpdateSerializer(data=row, context=context, partial=True)
+        if not serializer.is_valid():
+            errors.append((row_number, serializer.errors))
+            continue
+        data = dict(serializer.validated_data)
+        client_id = data.pop('id')
+        if client_id in changes:
+            errors.append((row_number, {'id': ['client is listed twice']}))
+            continue
+        if 'code_number' in data:
+            context['code_numbers'][data['code_number']] = client_id
+        changes[client_id] = (context['clients'][client_id], data)
+
+    if errors:
+        return 0, errors
+    return serializers.ClientUpdateSerializer.apply_changes(list(changes.values())), errors
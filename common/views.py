@@ -1,9 +1,39 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET
+
 from rest_framework import views, generics, status
 from rest_framework.response import Response
 
 from django_filters.rest_framework import DjangoFilterBackend
 
-from common import models, serializers, filters
+from common import balances, caching, exports, jobs, loading, metrics, models, operations, reports, routers, serializers, filters, pagination, sync, utils
+
+
+def accepted(request, job):
+    url = request.build_absolute_uri(reverse('job detail api', kwargs={'job_id': job.id}))
+    data = dict(serializers.JobSerializer(job).data, url=url)
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+
+def background(request):
+    return request.query_params.get('background') in ('1', 'true')
+
+
+class ValuesListMixin:
+    # list() through a ValuesSerializer instead of serializer_class
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        rows = self.values_serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.values_serializer.many(page))
+        return Response(self.values_serializer.many(rows))
 
 
 class ClientCreateApiView(generics.GenericAPIView):
@@ -18,9 +48,29 @@ class ClientCreateApiView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
-class RegionListApiView(generics.ListAPIView):
+class ClientImportApiView(generics.GenericAPIView):
+    serializer_class = serializers.ClientCreateSerializer
+    queryset = models.Client
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of clients'}, status=status.HTTP_400_BAD_REQUEST)
+        created = 0
+        errors = []
+        for batch_created, batch_errors in utils.import_clients(request.data):
+            created += batch_created
+            errors.extend({'row': row, 'errors': row_errors} for row, row_errors in batch_errors)
+        return Response(
+            {'created': created, 'errors': errors},
+            status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST
+        )
+
+
+class RegionListApiView(caching.CachedListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = serializers.RegionListSerializer
-    queryset = models.Region.objects.all()
+    values_serializer = serializers.region_values
+    queryset = models.Region.objects.order_by('id')
+    cache_name = 'regions'
 
 
 class ClientOrderCreateApiView(generics.GenericAPIView):
@@ -35,32 +85,39 @@ class ClientOrderCreateApiView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
-class ClientOrderListApiView(generics.GenericAPIView):
+@method_decorator(condition(etag_func=caching.client_orders_etag), name='get')
+class ClientOrderListApiView(routers.ReplicaReadMixin, generics.GenericAPIView):
     serializer_class = serializers.ClientOrderListSerializer
     queryset = models.Order
+    pagination_class = pagination.CursorOrPageNumberPagination
 
     def get(self, request, client_id):
-        orders = models.Order.objects.filter(client=client_id).order_by('-created_at')
-        serializer = serializers.ClientOrderListSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        orders = models.Order.objects.filter(client=client_id).order_by('-created_at', '-id')
+        page = self.paginate_queryset(serializers.client_order_values.rows(orders))
+        return self.get_paginated_response(serializers.client_order_values.many(page))
     
+@method_decorator(condition(etag_func=caching.client_detail_etag), name='get')
 class ClientDetailApiView(generics.GenericAPIView):
     serializer_class = serializers.ClientDetailSerializer
-    queryset = models.Client
+    queryset = models.Client.objects.select_related('region', 'balance').prefetch_related('numbers')
 
     def get(self, request, client_id):
         try:
-            client = models.Client.objects.get(id=client_id)
+            client = self.get_queryset().get(id=client_id)
         except models.Client.DoesNotExist:
             return Response({'error': 'Client not found'}, status=status.HTTP_404_NOT_FOUND)
         serializer = serializers.ClientDetailSerializer(client)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
-class ClientListApiView(generics.ListAPIView):
+class ClientListApiView(routers.ReplicaReadMixin, generics.ListAPIView):
     serializer_class = serializers.ClientListSerializer
-    queryset = models.Client.objects.order_by('-created_at').distinct()
+    queryset = models.Client.objects.select_related('region', 'balance__last_order').prefetch_related(
+        'numbers',
+        Prefetch('number_of_trips', queryset=models.NumberOfTrips.objects.order_by('-id')[:1], to_attr='latest_number_of_trips'),
+    ).order_by('-created_at', '-id').distinct()
     filter_backends = [DjangoFilterBackend]
+    pagination_class = pagination.CursorOrPageNumberPagination
     filterset_class = filters.ClientFilter
     
 
@@ -81,6 +138,22 @@ class ClientUpdateApiView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+class ClientBulkUpdateApiView(generics.GenericAPIView):
+    serializer_class = serializers.ClientBulkUpdateSerializer
+    queryset = models.Client
+
+    def patch(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of clients'}, status=status.HTTP_400_BAD_REQUEST)
+        updated, errors = utils.update_clients(request.data)
+        if errors:
+            return Response(
+                {'errors': [{'row': row, 'errors': row_errors} for row, row_errors in errors]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'success': True, 'updated': updated}, status=status.HTTP_200_OK)
+
+
 class ClientOrderUpdateApiView(generics.UpdateAPIView):
     serializer_class = serializers.ClientOrderUpdateSerializer
     queryset = models.Order
@@ -102,22 +175,28 @@ class OrderStatusUpdateApiView(generics.GenericAPIView):
     def post(self, request):
         serializer = serializers.OrderStatusUpdateSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            data = serializer.data
-            for id in data['ids']:
-                try:
-                    order = models.Order.objects.get(id=id)
-                    order.status = 'taken'
-                    order.save()
-                except models.Order.DoesNotExist:
-                    return Response({'success': False}, status=status.HTTP_404_NOT_FOUND)
-            return Response({'success': True}, status=status.HTTP_200_OK)
+            data = serializer.validated_data
+            ids = list(dict.fromkeys(data['ids']))
+            with transaction.atomic():
+                orders = models.Order.objects.filter(id__in=ids)
+                if data['lock']:
+                    orders = orders.select_for_update()
+                found = set(orders.values_list('id', flat=True))
+                models.Order.objects.filter(id__in=found).update(status='taken', updated_at=timezone.now())
+                balances.record_orders_status(found, 'taken')
+            updated = [id for id in ids if id in found]
+            missing = [id for id in ids if id not in found]
+            # the found orders are committed, so only a request that changed
+            # nothing is a 404
+            return Response(
+                {'success': not missing, 'updated': updated, 'missing': missing},
+                status=status.HTTP_200_OK if updated else status.HTTP_404_NOT_FOUND
+            )
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class OrderStatusChangeApiView(generics.GenericAPIView):
-    serializer_class = None 
-    queryset = models.Order.objects.all()
+class OrderStatusChangeApiView(views.APIView):
 
     def get(self, request, order_id):
         try:
@@ -125,7 +204,9 @@ class OrderStatusChangeApiView(generics.GenericAPIView):
         except models.Order.DoesNotExist:
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
         order.status = 'cancelled'
-        order.save()
+        with transaction.atomic():
+            order.save()
+            balances.record_orders_status([order.id], order.status)
         return Response({'status': order.status}, status=status.HTTP_200_OK)
 
 
@@ -136,11 +217,28 @@ class NumberOfTripsCreateApiView(generics.GenericAPIView):
     def post(self, request):
         serializer = serializers.NumberOfTripsCreateSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
+            data = serializer.validated_data
+            if data['background']:
+                job = jobs.enqueue('assign_trips', {'client_ids': data['client_ids'], 'number': data['number']})
+                return accepted(request, job)
             serializer.save()
             return Response({"success": True}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TruckLoadApiView(generics.GenericAPIView):
+    serializer_class = serializers.TruckLoadSerializer
+    queryset = models.Order.objects.all()
+
+    def post(self, request):
+        serializer = serializers.TruckLoadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = loading.load_truck(data['capacity'], regions=data.get('regions'), number=data.get('number'))
+        code = status.HTTP_201_CREATED if data.get('number') is not None else status.HTTP_200_OK
+        return Response(result, status=code)
+
+
 class NumberOfTripsDeleteApiView(generics.DestroyAPIView):
     queryset = models.NumberOfTrips.objects.all()
     lookup_field = 'id'
@@ -159,4 +257,109 @@ class ClientOrderListUpdateApiView(generics.GenericAPIView):
         if serializer.is_valid(raise_exception=True):
             serializer.save()
             return Response({"success": True}, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_200_OK)
+
+
+class OrderOperationBatchApiView(generics.GenericAPIView):
+    serializer_class = serializers.OrderOperationBatchSerializer
+    queryset = models.Order.objects.all()
+
+    def post(self, request):
+        serializer = serializers.OrderOperationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = operations.apply_operations(serializer.validated_data['operations'])
+        except IntegrityError:
+            # the same keys were committed by a concurrent request; a retry replays them
+            return Response({'error': 'Operations are being processed, retry'}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class SyncApiView(views.APIView):
+    def get(self, request):
+        token = request.query_params.get('token')
+        since = sync.parse_token(token)
+        if token and since is None:
+            return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+        region = request.query_params.get('region')
+        if region is not None and not region.isdigit():
+            return Response({'error': 'Invalid region'}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(sync.iter_sync(since, region), content_type='application/json')
+
+
+class ClientExportApiView(views.APIView):
+    def get(self, request):
+        filterset = filters.ClientFilter(request.query_params, queryset=exports.client_queryset().order_by('id'))
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        if background(request):
+            return accepted(request, jobs.enqueue('export', {'kind': 'clients', 'params': filterset.data.dict()}))
+        response = StreamingHttpResponse(
+            exports.iter_csv(exports.CLIENT_HEADER, exports.client_rows(filterset.qs)), content_type='text/csv'
+        )
+        response['Content-Disposition'] = 'attachment; filename="clients.csv"'
+        return response
+
+
+class OrderExportApiView(views.APIView):
+    def get(self, request):
+        filterset = filters.OrderFilter(request.query_params, queryset=exports.order_queryset())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        if background(request):
+            return accepted(request, jobs.enqueue('export', {'kind': 'orders', 'params': filterset.data.dict()}))
+        response = StreamingHttpResponse(
+            exports.iter_csv(exports.ORDER_HEADER, exports.order_rows(filterset.qs)), content_type='text/csv'
+        )
+        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
+        return response
+
+
+class ReportApiView(routers.ReplicaReadMixin, generics.GenericAPIView):
+    serializer_class = serializers.ReportQuerySerializer
+    queryset = models.DailyOrderRollup.objects.all()
+
+    def get(self, request):
+        serializer = serializers.ReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows = reports.report(
+            data['date_from'], data['date_to'], group_by=data.get('group_by', ()),
+            region=data.get('region'), payment_type=data.get('payment_type'),
+        )
+        return Response(rows, status=status.HTTP_200_OK)
+
+
+
+class BalanceRebuildApiView(generics.GenericAPIView):
+    serializer_class = serializers.BalanceRebuildSerializer
+    queryset = models.ClientBalance.objects.all()
+
+    def post(self, request):
+        serializer = serializers.BalanceRebuildSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return accepted(request, jobs.enqueue('rebuild_balances', serializer.validated_data))
+
+
+class JobListApiView(generics.ListAPIView):
+    serializer_class = serializers.JobSerializer
+    queryset = models.Job.objects.order_by('-id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'name']
+
+
+class JobDetailApiView(generics.GenericAPIView):
+    serializer_class = serializers.JobSerializer
+    queryset = models.Job.objects.all()
+
+    def get(self, request, job_id):
+        try:
+            job = models.Job.objects.get(id=job_id)
+        except models.Job.DoesNotExist:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(serializers.JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+@require_GET
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -33,6 +33,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'common.middleware.InstrumentationMiddleware',
+    'common.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -74,9 +76,23 @@ DATABASES = {
         'PASSWORD': '20090912',
         'HOST': 'localhost',
         'PORT': '5432',
-    }
+    },
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'water_crm',
+    #     'USER': 'postgres',
+    #     'PASSWORD': '20090912',
+    #     'HOST': 'replica.local',
+    #     'PORT': '5432',
+    # },
 }
 
+# views using common.routers.ReplicaReadMixin read from these aliases; a
+# client that wrote something reads from the primary for REPLICA_PIN_SECONDS
+DATABASE_ROUTERS = ['common.routers.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_PIN_SECONDS = 5
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -85,6 +101,33 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# local memory is per process: with several workers use the file or redis
+# backend so that region changes invalidate every worker at once
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'water_crm',
+    }
+}
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#         'LOCATION': BASE_DIR / 'cache',
+#     }
+# }
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,13 +175,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 REST_FRAMEWORK = {
+    # orjson-backed when orjson is installed, plain DRF JSON otherwise
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'common.renderers.ORJSONParser',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'common.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10, 
 }
 
+# requests slower than this are logged by common.middleware
+SLOW_REQUEST_MS = 500
+
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -146,4 +197,7 @@ CSRF_TRUSTED_ORIGINS = [
     "https://behruz.repid.uz",
 ]
 
-SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
\ No newline at end of file
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# generated OpenAPI documents served by swagger/, see common/schema.py
+OPENAPI_SCHEMA_ROOT = BASE_DIR / 'schema'
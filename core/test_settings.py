@@ -0,0 +1,18 @@
+# python manage.py test --settings=core.test_settings
+# Two local SQLite databases stand in for the PostgreSQL primary and a replica.
+
+from core.settings import *  # noqa
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+# opted in per test, so that other tests never read rows they did not write
+DATABASE_REPLICAS = []
@@ -1,27 +1,14 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-
-from common.permissions import IsStaffOr404
-
-schema_view = get_schema_view(
-    info=openapi.Info(
-        title="Musaffo Suv Crm",
-        default_version='version 1',
-        description='this is first version of musaffo water crm',
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(IsStaffOr404,),
-)
+from common.schema import SchemaView
+from common.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/common/', include('common.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 
-   path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+   path('swagger/', SchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+   re_path(r'^swagger\.(?P<format>json|yaml)$', SchemaView.without_ui(cache_timeout=0), name='schema-file'),
 ]